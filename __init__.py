@@ -6,6 +6,7 @@ from loguru import logger
 
 from .crud import db
 from .tasks import wait_for_paid_invoices, hourly_transaction_polling
+from .transaction_processor import shutdown_lamassu_processor
 from .views import satmachineadmin_generic_router
 from .views_api import satmachineadmin_api_router
 
@@ -27,6 +28,8 @@ satmachineadmin_static_files = [
 ]
 
 scheduled_tasks: list[asyncio.Task] = []
+# Keeps the shutdown task referenced until it has finished
+shutdown_tasks: set[asyncio.Task] = set()
 
 
 def satmachineadmin_stop():
@@ -35,6 +38,15 @@ def satmachineadmin_stop():
             task.cancel()
         except Exception as ex:
             logger.warning(ex)
+    
+    # Close the Lamassu pool and SSH tunnel so neither the connections, the ssh process
+    # nor the temporary key file outlive the extension
+    try:
+        shutdown_task = asyncio.get_running_loop().create_task(shutdown_lamassu_processor())
+        shutdown_tasks.add(shutdown_task)
+        shutdown_task.add_done_callback(shutdown_tasks.discard)
+    except Exception as ex:
+        logger.warning(ex)
 
 
 def satmachineadmin_start():
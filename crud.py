@@ -1,10 +1,15 @@
 # Description: This file contains the CRUD operations for talking to the database.
 
-from typing import List, Optional, Union
+import asyncio
+import functools
+import time
+from typing import Dict, List, Optional, Set, Union
 from datetime import datetime, timezone
 
+from lnbits.core.db import db as core_db
 from lnbits.db import Database
 from lnbits.helpers import urlsafe_short_hash
+from loguru import logger
 
 from .models import (
     CreateDcaClientData, DcaClient, UpdateDcaClientData,
@@ -17,6 +22,35 @@ from .models import (
 
 db = Database("ext_satoshimachine")
 
+# Seconds a fetched active Lamassu config is reused before it is read again
+ACTIVE_CONFIG_CACHE_TTL = 30
+
+
+def memoize_async(ttl: float):
+    """Cache an async function's result per arguments for `ttl` seconds; concurrent callers share one in-flight call"""
+    def decorator(func):
+        cache: dict = {}
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            key = (args, tuple(sorted(kwargs.items())))
+            entry = cache.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                # Store the future itself (not the result) so callers arriving mid-fetch await the same query
+                entry = (time.monotonic() + ttl, asyncio.ensure_future(func(*args, **kwargs)))
+                cache[key] = entry
+            try:
+                return await asyncio.shield(entry[1])
+            except Exception:
+                # Never cache failures
+                if cache.get(key) is entry:
+                    del cache[key]
+                raise
+
+        wrapper.cache_clear = cache.clear
+        return wrapper
+    return decorator
+
 
 # DCA Client CRUD Operations
 async def create_dca_client(data: CreateDcaClientData) -> DcaClient:
@@ -181,6 +215,50 @@ async def create_dca_payment(data: CreateDcaPaymentData) -> DcaPayment:
     return await get_dca_payment(payment_id)
 
 
+async def create_dca_payments(payments: List[CreateDcaPaymentData]) -> List[str]:
+    """Record several DCA payments with one multi-row INSERT, returning their IDs in order"""
+    columns = (
+        "id", "client_id", "amount_sats", "amount_fiat", "exchange_rate", "transaction_type",
+        "lamassu_transaction_id", "payment_hash", "status", "created_at", "transaction_time"
+    )
+    # Keep each statement well below SQLite's bound parameter limit
+    chunk_size = 50
+    created_at = datetime.now()
+    payment_ids = []
+    
+    for start in range(0, len(payments), chunk_size):
+        rows = []
+        params = {}
+        for index, data in enumerate(payments[start:start + chunk_size]):
+            payment_id = urlsafe_short_hash()
+            payment_ids.append(payment_id)
+            row = {
+                "id": payment_id,
+                "client_id": data.client_id,
+                "amount_sats": data.amount_sats,
+                "amount_fiat": data.amount_fiat,
+                "exchange_rate": data.exchange_rate,
+                "transaction_type": data.transaction_type,
+                "lamassu_transaction_id": data.lamassu_transaction_id,
+                "payment_hash": data.payment_hash,
+                "status": "pending",
+                "created_at": created_at,
+                "transaction_time": data.transaction_time
+            }
+            rows.append("(" + ", ".join(f":{column}_{index}" for column in columns) + ")")
+            params.update({f"{column}_{index}": row[column] for column in columns})
+        
+        await db.execute(
+            f"""
+            INSERT INTO satoshimachine.dca_payments 
+            ({", ".join(columns)})
+            VALUES {", ".join(rows)}
+            """,
+            params
+        )
+    return payment_ids
+
+
 async def get_dca_payment(payment_id: str) -> Optional[DcaPayment]:
     return await db.fetchone(
         "SELECT * FROM satoshimachine.dca_payments WHERE id = :id",
@@ -212,6 +290,21 @@ async def update_dca_payment_status(payment_id: str, status: str) -> None:
     )
 
 
+async def update_dca_payment_statuses(payment_ids: List[str], status: str) -> None:
+    """Set the same status on several DCA payments with one UPDATE per chunk of IDs"""
+    # Keep each statement well below SQLite's bound parameter limit
+    chunk_size = 50
+    for start in range(0, len(payment_ids), chunk_size):
+        params = {f"id_{index}": payment_id for index, payment_id in enumerate(payment_ids[start:start + chunk_size])}
+        await db.execute(
+            f"""
+            UPDATE satoshimachine.dca_payments SET status = :status
+            WHERE id IN ({", ".join(f":{key}" for key in params)})
+            """,
+            {**params, "status": status}
+        )
+
+
 async def get_payments_by_lamassu_transaction(lamassu_transaction_id: str) -> List[DcaPayment]:
     return await db.fetchall(
         "SELECT * FROM satoshimachine.dca_payments WHERE lamassu_transaction_id = :transaction_id",
@@ -220,16 +313,58 @@ async def get_payments_by_lamassu_transaction(lamassu_transaction_id: str) -> Li
     )
 
 
+# A Lamassu transaction is processed once it is stored (every credited transaction is, including
+# those without distributions) or has DCA payments recorded against it
+
+async def lamassu_transaction_is_processed(lamassu_transaction_id: str) -> bool:
+    """Check whether a Lamassu transaction was already processed (no rows are loaded)"""
+    row = await db.fetchone(
+        """
+        SELECT 1 FROM satoshimachine.lamassu_transactions WHERE lamassu_transaction_id = :transaction_id
+        UNION ALL
+        SELECT 1 FROM satoshimachine.dca_payments WHERE lamassu_transaction_id = :transaction_id
+        LIMIT 1
+        """,
+        {"transaction_id": lamassu_transaction_id}
+    )
+    return row is not None
+
+
+async def get_processed_lamassu_transaction_ids(since: datetime) -> List[str]:
+    """Get IDs of already processed Lamassu transactions, for ATM transactions after a cutoff"""
+    rows = await db.fetchall(
+        """
+        SELECT lamassu_transaction_id 
+        FROM satoshimachine.lamassu_transactions 
+        WHERE transaction_time > :since
+        UNION
+        SELECT lamassu_transaction_id 
+        FROM satoshimachine.dca_payments 
+        WHERE lamassu_transaction_id IS NOT NULL AND transaction_time > :since
+        """,
+        {"since": since}
+    )
+    return [row["lamassu_transaction_id"] for row in rows]
+
+
 # Balance and Summary Operations
+
+# Payments that count against a client's balance, for both the balance shown to admins and the one used
+# for distribution: pending payments are still being paid out by a concurrently processed transaction,
+# so they already reserve their share (failed payments never left the source wallet)
+BALANCE_PAYMENT_STATUSES = "('confirmed', 'pending')"
+
 async def get_client_balance_summary(client_id: str, as_of_time: Optional[datetime] = None) -> ClientBalanceSummary:
     """Get client balance summary, optionally as of a specific point in time"""
     
-    # Build time filter for temporal accuracy
+    # Build time filters for temporal accuracy (payments are dated by their ATM transaction time)
     time_filter = ""
+    payment_time_filter = ""
     params = {"client_id": client_id}
     
     if as_of_time is not None:
         time_filter = "AND confirmed_at <= :as_of_time"
+        payment_time_filter = "AND COALESCE(transaction_time, created_at) <= :as_of_time"
         params["as_of_time"] = as_of_time
     
     # Get total confirmed deposits (only those confirmed before the cutoff time)
@@ -248,7 +383,7 @@ async def get_client_balance_summary(client_id: str, as_of_time: Optional[dateti
         f"""
         SELECT COALESCE(SUM(amount_fiat), 0) as total 
         FROM satoshimachine.dca_payments 
-        WHERE client_id = :client_id AND status = 'confirmed' {time_filter}
+        WHERE client_id = :client_id AND status IN {BALANCE_PAYMENT_STATUSES} {payment_time_filter}
         """,
         params
     )
@@ -259,7 +394,6 @@ async def get_client_balance_summary(client_id: str, as_of_time: Optional[dateti
     
     # Log temporal filtering if as_of_time was used
     if as_of_time is not None:
-        from lnbits.core.services import logger
         # Verify timezone consistency for temporal filtering
         tz_info = "UTC" if as_of_time.tzinfo == timezone.utc else f"TZ: {as_of_time.tzinfo}"
         logger.info(f"Client {client_id[:8]}... balance as of {as_of_time} ({tz_info}): {total_deposits - total_payments} centavos remaining")
@@ -273,6 +407,71 @@ async def get_client_balance_summary(client_id: str, as_of_time: Optional[dateti
     )
 
 
+async def get_client_balances_bulk(client_ids: List[str], as_of_time: Optional[datetime] = None) -> Dict[str, ClientBalanceSummary]:
+    """Get balance summaries for several clients with one aggregated query per table (used for distribution)"""
+    if not client_ids:
+        return {}
+    
+    params = {f"client_id_{index}": client_id for index, client_id in enumerate(client_ids)}
+    id_list = ", ".join(f":{key}" for key in params)
+    time_filter = ""
+    payment_time_filter = ""
+    if as_of_time is not None:
+        time_filter = "AND confirmed_at <= :as_of_time"
+        payment_time_filter = "AND COALESCE(transaction_time, created_at) <= :as_of_time"
+        params["as_of_time"] = as_of_time
+    
+    deposit_rows = await db.fetchall(
+        f"""
+        SELECT client_id, COALESCE(SUM(amount), 0) as total, MAX(currency) as currency
+        FROM satoshimachine.dca_deposits
+        WHERE client_id IN ({id_list}) AND status = 'confirmed' {time_filter}
+        GROUP BY client_id
+        """,
+        params
+    )
+    payment_rows = await db.fetchall(
+        f"""
+        SELECT client_id, COALESCE(SUM(amount_fiat), 0) as total
+        FROM satoshimachine.dca_payments
+        WHERE client_id IN ({id_list}) AND status IN {BALANCE_PAYMENT_STATUSES} {payment_time_filter}
+        GROUP BY client_id
+        """,
+        params
+    )
+    
+    deposits = {row["client_id"]: row for row in deposit_rows}
+    payments = {row["client_id"]: row["total"] for row in payment_rows}
+    summaries = {}
+    for client_id in client_ids:
+        deposit_row = deposits.get(client_id)
+        total_deposits = deposit_row["total"] if deposit_row else 0
+        total_payments = payments.get(client_id, 0)
+        summaries[client_id] = ClientBalanceSummary(
+            client_id=client_id,
+            total_deposits=total_deposits,
+            total_payments=total_payments,
+            remaining_balance=total_deposits - total_payments,
+            currency=deposit_row["currency"] if deposit_row else "GTQ"
+        )
+    return summaries
+
+
+async def get_existing_wallet_ids(wallet_ids: List[str]) -> Set[str]:
+    """Return which of the given LNbits wallet IDs exist (and are not deleted), in one query"""
+    if not wallet_ids:
+        return set()
+    params = {f"wallet_id_{index}": wallet_id for index, wallet_id in enumerate(wallet_ids)}
+    rows = await core_db.fetchall(
+        f"""
+        SELECT id FROM wallets
+        WHERE id IN ({", ".join(f":{key}" for key in params)}) AND deleted = :deleted
+        """,
+        {**params, "deleted": False}
+    )
+    return {row["id"] for row in rows}
+
+
 async def get_flow_mode_clients() -> List[DcaClient]:
     return await db.fetchall(
         "SELECT * FROM satoshimachine.dca_clients WHERE dca_mode = 'flow' AND status = 'active'",
@@ -325,6 +524,7 @@ async def create_lamassu_config(data: CreateLamassuConfigData) -> LamassuConfig:
             "ssh_private_key": data.ssh_private_key
         }
     )
+    get_active_lamassu_config.cache_clear()
     return await get_lamassu_config(config_id)
 
 
@@ -336,6 +536,7 @@ async def get_lamassu_config(config_id: str) -> Optional[LamassuConfig]:
     )
 
 
+@memoize_async(ttl=ACTIVE_CONFIG_CACHE_TTL)
 async def get_active_lamassu_config() -> Optional[LamassuConfig]:
     return await db.fetchone(
         "SELECT * FROM satoshimachine.lamassu_config WHERE is_active = true ORDER BY created_at DESC LIMIT 1",
@@ -363,6 +564,7 @@ async def update_lamassu_config(config_id: str, data: UpdateLamassuConfigData) -
         f"UPDATE satoshimachine.lamassu_config SET {set_clause} WHERE id = :id",
         update_data
     )
+    get_active_lamassu_config.cache_clear()
     return await get_lamassu_config(config_id)
 
 
@@ -381,6 +583,7 @@ async def update_config_test_result(config_id: str, success: bool) -> None:
             "updated_at": utc_now
         }
     )
+    get_active_lamassu_config.cache_clear()
 
 
 async def delete_lamassu_config(config_id: str) -> None:
@@ -388,6 +591,7 @@ async def delete_lamassu_config(config_id: str) -> None:
         "DELETE FROM satoshimachine.lamassu_config WHERE id = :id", 
         {"id": config_id}
     )
+    get_active_lamassu_config.cache_clear()
 
 
 async def update_poll_start_time(config_id: str) -> None:
@@ -405,28 +609,48 @@ async def update_poll_start_time(config_id: str) -> None:
             "updated_at": utc_now
         }
     )
+    get_active_lamassu_config.cache_clear()
 
 
-async def update_poll_success_time(config_id: str) -> None:
-    """Update the last successful poll time"""
+async def update_poll_success_time(config_id: str, watermark: Optional[datetime] = None) -> None:
+    """Update the last successful poll time and advance the watermark to the newest transaction time seen"""
     utc_now = datetime.now(timezone.utc)
+    if watermark is None:
+        # Nothing new was fetched - keep the previous watermark so no transaction can slip past it
+        await db.execute(
+            """
+            UPDATE satoshimachine.lamassu_config 
+            SET last_successful_poll = :poll_time, updated_at = :updated_at
+            WHERE id = :id
+            """,
+            {"id": config_id, "poll_time": utc_now, "updated_at": utc_now}
+        )
+        get_active_lamassu_config.cache_clear()
+        return
+    
     await db.execute(
         """
         UPDATE satoshimachine.lamassu_config 
-        SET last_successful_poll = :poll_time, updated_at = :updated_at
+        SET last_successful_poll = :poll_time, poll_watermark = :watermark, updated_at = :updated_at
         WHERE id = :id
         """,
         {
             "id": config_id,
             "poll_time": utc_now,
+            "watermark": watermark,
             "updated_at": utc_now
         }
     )
+    get_active_lamassu_config.cache_clear()
 
 
 # Lamassu Transaction Storage CRUD Operations
-async def create_lamassu_transaction(data: CreateLamassuTransactionData) -> StoredLamassuTransaction:
-    """Store a processed Lamassu transaction"""
+async def create_lamassu_transaction(
+    data: CreateLamassuTransactionData,
+    clients_count: int = 0,
+    distributions_total_sats: int = 0
+) -> StoredLamassuTransaction:
+    """Store a processed Lamassu transaction together with its distribution statistics"""
     transaction_id = urlsafe_short_hash()
     await db.execute(
         """
@@ -456,8 +680,8 @@ async def create_lamassu_transaction(data: CreateLamassuTransactionData) -> Stor
             "device_id": data.device_id,
             "transaction_time": data.transaction_time,
             "processed_at": datetime.now(),
-            "clients_count": 0,  # Will be updated after distributions
-            "distributions_total_sats": 0  # Will be updated after distributions
+            "clients_count": clients_count,
+            "distributions_total_sats": distributions_total_sats
         }
     )
     return await get_lamassu_transaction(transaction_id)
@@ -487,23 +711,3 @@ async def get_all_lamassu_transactions() -> List[StoredLamassuTransaction]:
         "SELECT * FROM satoshimachine.lamassu_transactions ORDER BY transaction_time DESC",
         model=StoredLamassuTransaction,
     )
-
-
-async def update_lamassu_transaction_distribution_stats(
-    transaction_id: str, 
-    clients_count: int, 
-    distributions_total_sats: int
-) -> None:
-    """Update distribution statistics for a Lamassu transaction"""
-    await db.execute(
-        """
-        UPDATE satoshimachine.lamassu_transactions 
-        SET clients_count = :clients_count, distributions_total_sats = :distributions_total_sats 
-        WHERE id = :id
-        """,
-        {
-            "clients_count": clients_count,
-            "distributions_total_sats": distributions_total_sats,
-            "id": transaction_id
-        }
-    )
@@ -2,6 +2,8 @@
 # Creates all necessary tables for Dollar Cost Averaging administration
 # with Lamassu ATM integration
 
+from lnbits.db import SQLITE
+
 
 async def m001_initial_dca_schema(db):
     """
@@ -122,4 +124,45 @@ async def m002_add_transaction_time_to_dca_payments(db):
         ALTER TABLE satoshimachine.dca_payments 
         ADD COLUMN transaction_time TIMESTAMP
         """
-    )
\ No newline at end of file
+    )
+
+
+async def m003_index_dca_payments_lamassu_transaction_id(db):
+    """
+    Index dca_payments by Lamassu transaction ID (duplicate-transaction check on every poll)
+    """
+    if db.type == SQLITE:
+        # SQLite takes the schema on the index name and does not allow a qualified table name
+        await db.execute(
+            """
+            CREATE INDEX IF NOT EXISTS satoshimachine.idx_dca_payments_lamassu_transaction_id
+            ON dca_payments (lamassu_transaction_id)
+            """
+        )
+    else:
+        await db.execute(
+            """
+            CREATE INDEX IF NOT EXISTS idx_dca_payments_lamassu_transaction_id
+            ON satoshimachine.dca_payments (lamassu_transaction_id)
+            """
+        )
+
+
+async def m004_add_poll_watermark_to_lamassu_config(db):
+    """
+    Add poll_watermark field to lamassu_config table to store the newest processed
+    transaction time, keeping last_successful_poll as the wall-clock poll time
+    """
+    await db.execute(
+        """
+        ALTER TABLE satoshimachine.lamassu_config 
+        ADD COLUMN poll_watermark TIMESTAMP
+        """
+    )
+    # Existing installations continue from where the last successful poll left off
+    await db.execute(
+        """
+        UPDATE satoshimachine.lamassu_config 
+        SET poll_watermark = last_successful_poll
+        """
+    )
@@ -1,5 +1,6 @@
 # Description: Pydantic data models dictate what is passed between frontend and backend.
 
+from dataclasses import dataclass
 from datetime import datetime
 from typing import Optional
 
@@ -104,6 +105,35 @@ class LamassuTransaction(BaseModel):
     timestamp: datetime
 
 
+@dataclass
+class LamassuRow:
+    """Cash-out row fetched from Lamassu (field names match the poll query's column aliases)"""
+    # Explicit __slots__ (dataclass(slots=True) needs Python 3.10); fields have no defaults, so they don't clash
+    __slots__ = (
+        "transaction_id", "fiat_amount", "crypto_amount", "transaction_time", "device_id",
+        "status", "commission_percentage", "discount", "crypto_code", "fiat_code",
+    )
+    transaction_id: str
+    fiat_amount: int
+    crypto_amount: int
+    transaction_time: datetime
+    device_id: Optional[str]
+    status: str
+    commission_percentage: float
+    discount: float
+    crypto_code: str
+    fiat_code: str
+
+
+@dataclass(frozen=True)
+class TxEconomics:
+    """Commission split and exchange rate of a Lamassu transaction, computed once per transaction"""
+    base_sats: int
+    commission_sats: int
+    exchange_rate: float  # sats per fiat unit
+    effective_commission: float
+
+
 # Lamassu Transaction Storage Models
 class CreateLamassuTransactionData(BaseModel):
     lamassu_transaction_id: str
@@ -187,6 +217,8 @@ class LamassuConfig(BaseModel):
     # Poll tracking
     last_poll_time: Optional[datetime] = None
     last_successful_poll: Optional[datetime] = None
+    # Newest transaction time processed (lower bound of the next poll)
+    poll_watermark: Optional[datetime] = None
 
 
 class UpdateLamassuConfigData(BaseModel):
@@ -0,0 +1,88 @@
+import asyncio
+
+import pytest
+
+from .. import crud
+from ..crud import memoize_async
+
+
+# memoized async reads (the active Lamassu config)
+@pytest.mark.asyncio
+async def test_memoize_async_shares_in_flight_call():
+    calls = []
+
+    @memoize_async(ttl=30)
+    async def read(key):
+        calls.append(key)
+        await asyncio.sleep(0.01)
+        return object()
+
+    results = await asyncio.gather(*(read("a") for _ in range(5)))
+    assert len(calls) == 1
+    assert all(result is results[0] for result in results)
+    # Different arguments are cached separately
+    await read("b")
+    assert calls == ["a", "b"]
+
+
+@pytest.mark.asyncio
+async def test_memoize_async_does_not_cache_failures():
+    calls = []
+
+    @memoize_async(ttl=30)
+    async def read():
+        calls.append(None)
+        if len(calls) == 1:
+            raise RuntimeError("database unavailable")
+        return "config"
+
+    with pytest.raises(RuntimeError):
+        await read()
+    assert await read() == "config"
+    assert await read() == "config"
+    assert len(calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_memoize_async_expires_after_ttl():
+    calls = []
+
+    @memoize_async(ttl=0.05)
+    async def read():
+        calls.append(None)
+        return len(calls)
+
+    assert await read() == 1
+    assert await read() == 1
+    await asyncio.sleep(0.06)
+    assert await read() == 2
+
+
+@pytest.mark.asyncio
+async def test_config_write_clears_active_config_cache(monkeypatch):
+    class FakeDb:
+        """Stands in for the extension database: returns the current config, records writes"""
+
+        def __init__(self):
+            self.config = "old config"
+            self.reads = 0
+
+        async def fetchone(self, *args, **kwargs):
+            self.reads += 1
+            return self.config
+
+        async def execute(self, *args, **kwargs):
+            self.config = "new config"
+
+    fake_db = FakeDb()
+    monkeypatch.setattr(crud, "db", fake_db)
+    crud.get_active_lamassu_config.cache_clear()
+
+    assert await crud.get_active_lamassu_config() == "old config"
+    assert await crud.get_active_lamassu_config() == "old config"
+    assert fake_db.reads == 1
+
+    await crud.update_poll_start_time("config_id")
+    assert await crud.get_active_lamassu_config() == "new config"
+    assert fake_db.reads == 2
+    crud.get_active_lamassu_config.cache_clear()
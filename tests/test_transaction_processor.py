@@ -0,0 +1,62 @@
+from ..transaction_processor import apportion_sats, split_commission
+
+
+# commission split (crypto_atoms already includes the commission)
+def test_split_commission_example():
+    # CLAUDE.md example: 2000 GTQ -> 266,800 sats at 3% commission, no discount
+    assert split_commission(266800, 0.03, 0.0) == (259029, 7771, 0.03)
+
+
+def test_split_commission_discount():
+    # A 50% discount halves the effective commission to 1.5%
+    base, commission, effective = split_commission(266800, 0.03, 50.0)
+    assert (base, commission) == (262857, 3943)
+    assert effective == 0.015
+
+
+def test_split_commission_zero_commission():
+    assert split_commission(266800, 0.0, 0.0) == (266800, 0, 0.0)
+    assert split_commission(266800, None, None) == (266800, 0, 0.0)
+    # A full discount leaves no commission either
+    assert split_commission(266800, 0.03, 100.0) == (266800, 0, 0.0)
+
+
+def test_split_commission_conserves_sats():
+    for crypto_atoms in (1, 99, 12345, 266800, 2_100_000_000_000_000):
+        base, commission, _ = split_commission(crypto_atoms, 0.045, 12.5)
+        assert base + commission == crypto_atoms
+        assert base >= 0 and commission >= 0
+
+
+# proportional distribution
+def test_apportion_sats_conserves_sats():
+    balances = {"a": 333, "b": 1000, "c": 7, "d": 2_500_000}
+    for total in (0, 1, 2, 99, 258835, 2_100_000_000_000_000):
+        assert sum(apportion_sats(total, balances).values()) == total
+
+
+def test_apportion_sats_largest_remainder_first():
+    # Quotas 1.67, 3.33 and 5: the one leftover sat goes to the largest remainder
+    assert apportion_sats(10, {"a": 1, "b": 2, "c": 3}) == {"a": 2, "b": 3, "c": 5}
+
+
+def test_apportion_sats_ties_go_to_first_listed():
+    assert apportion_sats(100, {"a": 1, "b": 1, "c": 1}) == {"a": 34, "b": 33, "c": 33}
+    assert apportion_sats(100, {"c": 1, "b": 1, "a": 1}) == {"c": 34, "b": 33, "a": 33}
+
+
+def test_apportion_sats_zero_balance_gets_nothing():
+    assert apportion_sats(7, {"a": 0, "b": 3, "c": 5}) == {"a": 0, "b": 3, "c": 4}
+
+
+# fiat value of a distribution (what client balances are charged with)
+def test_apportioned_fiat_adds_up_to_fiat_dispensed():
+    # 2000 GTQ across three equal balances: rounding each share would charge 3 x 667
+    fiat = apportion_sats(2000, {"a": 500, "b": 500, "c": 500})
+    assert fiat == {"a": 667, "b": 667, "c": 666}
+    assert sum(fiat.values()) == 2000
+    # Two 1-sat shares of 1 GTQ
+    assert sum(apportion_sats(1, {"a": 1, "b": 1}).values()) == 1
+    for fiat_amount in (1, 7, 100, 2000, 99999):
+        fiat = apportion_sats(fiat_amount, {"a": 333, "b": 1000, "c": 7})
+        assert sum(fiat.values()) == fiat_amount
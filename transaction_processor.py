@@ -2,24 +2,24 @@
 
 import asyncio
 import asyncpg
-from datetime import datetime, timedelta, timezone
-from typing import List, Optional, Dict, Any
-from loguru import logger
+import functools
+import os
+import shutil
 import socket
-import threading
+import subprocess
+import tempfile
 import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, List, Optional, Dict, Any, Tuple
+from loguru import logger
 
 try:
     import asyncssh
-    SSH_AVAILABLE = True
+    ASYNCSSH_AVAILABLE = True
 except ImportError:
-    try:
-        # Fallback to subprocess-based SSH tunnel
-        import subprocess
-        SSH_AVAILABLE = True
-    except ImportError:
-        SSH_AVAILABLE = False
-        logger.warning("SSH tunnel support not available")
+    # Fallback to subprocess-based SSH tunnel
+    ASYNCSSH_AVAILABLE = False
 
 from lnbits.core.services import create_invoice, pay_invoice
 from lnbits.core.crud.wallets import get_wallet
@@ -28,18 +28,98 @@ from lnbits.settings import settings
 
 from .crud import (
     get_flow_mode_clients,
-    get_payments_by_lamassu_transaction,
-    create_dca_payment,
-    get_client_balance_summary,
+    lamassu_transaction_is_processed,
+    get_processed_lamassu_transaction_ids,
+    create_dca_payments,
+    get_client_balances_bulk,
+    get_existing_wallet_ids,
     get_active_lamassu_config,
     update_config_test_result,
     update_poll_start_time,
     update_poll_success_time,
-    update_dca_payment_status,
-    create_lamassu_transaction,
-    update_lamassu_transaction_distribution_stats
+    update_dca_payment_statuses,
+    create_lamassu_transaction
 )
-from .models import CreateDcaPaymentData, LamassuTransaction, DcaClient, CreateLamassuTransactionData
+from .models import CreateDcaPaymentData, LamassuTransaction, LamassuRow, TxEconomics, DcaClient, CreateLamassuTransactionData, LamassuConfig
+
+# Upper bound for the in-memory processed-transaction cache (the database remains the source of truth)
+PROCESSED_CACHE_MAX_SIZE = 10_000
+# Maximum number of concurrent pay_invoice calls
+MAX_INFLIGHT_PAYMENTS = 16
+# Maximum number of client distributions of one transaction processed concurrently
+MAX_CONCURRENT_DISTRIBUTIONS = 8
+# Number of worker tasks processing a poll's transactions concurrently
+MAX_CONCURRENT_TRANSACTIONS = 4
+# Maximum number of fetched transactions waiting to be processed
+PENDING_QUEUE_MAX_SIZE = 256
+# Rows fetched per round trip when streaming new transactions from Lamassu
+FETCH_PREFETCH_ROWS = 1000
+# Connection pool sizing for the (tunnelled) Lamassu database
+LAMASSU_POOL_MIN_SIZE = 10
+LAMASSU_POOL_MAX_SIZE = 25
+# Integer scales for commission math (commission fraction -> parts per million, discount % -> basis points)
+COMMISSION_SCALE = 1_000_000
+DISCOUNT_SCALE = 10_000
+
+
+def _to_utc(value: datetime) -> datetime:
+    """Normalize a datetime to UTC (naive values are assumed to be UTC already)"""
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    # Fast path: asyncpg already returns timestamptz values in UTC
+    if value.tzinfo is timezone.utc or not value.utcoffset():
+        return value
+    return value.astimezone(timezone.utc)
+
+
+def split_commission(crypto_atoms: int, commission_percentage: Optional[float], discount: Optional[float]) -> Tuple[int, int, float]:
+    """Split crypto_atoms into (base sats, commission sats, effective commission) using exact integer math"""
+    commission_ppm = round((commission_percentage or 0) * COMMISSION_SCALE)
+    if commission_ppm <= 0:
+        return crypto_atoms, 0, 0.0
+    discount_bp = round((discount or 0) * 100)
+    # Effective commission after discount, scaled by COMMISSION_SCALE * DISCOUNT_SCALE
+    scale = COMMISSION_SCALE * DISCOUNT_SCALE
+    effective_scaled = commission_ppm * (DISCOUNT_SCALE - discount_bp)
+    # Since crypto_atoms already includes commission: crypto_atoms = base_amount * (1 + effective_commission)
+    base_crypto_atoms = crypto_atoms * scale // (scale + effective_scaled)
+    return base_crypto_atoms, crypto_atoms - base_crypto_atoms, effective_scaled / scale
+
+
+def apportion_sats(total_sats: int, balances: Dict[str, int]) -> Dict[str, int]:
+    """Split total_sats in proportion to balances with largest-remainder (Hamilton) apportionment in integers"""
+    # Floor every client's quota, then hand the leftover sats one each to the largest remainders so
+    # no sat is lost (ties go to the client listed first)
+    total_balance = sum(balances.values())
+    client_sats = {}
+    remainders = {}
+    for client_id, balance in balances.items():
+        client_sats[client_id], remainders[client_id] = divmod(total_sats * balance, total_balance)
+    leftover_sats = total_sats - sum(client_sats.values())
+    for client_id in sorted(remainders, key=remainders.get, reverse=True)[:leftover_sats]:
+        client_sats[client_id] += 1
+    return client_sats
+
+
+def compute_economics(transaction: LamassuRow) -> TxEconomics:
+    """Split a transaction into base and commission sats and derive its exchange rate"""
+    base_sats, commission_sats, effective_commission = split_commission(
+        transaction.crypto_amount, transaction.commission_percentage, transaction.discount
+    )
+    # Exchange rate is based on base amounts (sats per fiat unit), rounded so stored values are reproducible
+    exchange_rate = round(base_sats / transaction.fiat_amount, 8) if transaction.fiat_amount > 0 else 0
+    return TxEconomics(
+        base_sats=base_sats,
+        commission_sats=commission_sats,
+        exchange_rate=exchange_rate,
+        effective_commission=effective_commission
+    )
+
+
+@functools.lru_cache(maxsize=1)
+def _has_sshpass() -> bool:
+    """Check once whether sshpass is installed (needed for password-based subprocess tunnels)"""
+    return shutil.which("sshpass") is not None
 
 
 class LamassuTransactionProcessor:
@@ -47,10 +127,37 @@ class LamassuTransactionProcessor:
     
     def __init__(self):
         self.last_check_time = None
-        self.processed_transaction_ids = set()
+        self.processed_transaction_ids: OrderedDict[str, None] = OrderedDict()
+        self.inflight_payments = asyncio.Semaphore(MAX_INFLIGHT_PAYMENTS)
+        # Serializes the accounting part of transaction processing (credit, balances, payment records)
+        self.accounting_lock = asyncio.Lock()
+        self.pending_queue: asyncio.Queue = asyncio.Queue(maxsize=PENDING_QUEUE_MAX_SIZE)
         self.ssh_process = None
+        self.ssh_conn = None
+        self.ssh_listener = None
         self.ssh_key_path = None
         self.ssh_config_path = None
+        self.pool: Optional[asyncpg.Pool] = None
+        self.pool_config_key: Optional[tuple] = None
+        self.connect_params: Optional[Dict[str, Any]] = None
+        # Serializes the tunnel/pool check-and-setup so concurrent callers never tear down each other's pool
+        self.connection_lock = asyncio.Lock()
+        self.poll_index_checked = False
+        self.poll_index_task: Optional[asyncio.Task] = None
+    
+    def is_processed(self, transaction_id: str) -> bool:
+        """Check the bounded LRU cache of transactions handled by this process"""
+        if transaction_id in self.processed_transaction_ids:
+            self.processed_transaction_ids.move_to_end(transaction_id)
+            return True
+        return False
+    
+    def mark_processed(self, transaction_id: str) -> None:
+        """Remember a handled transaction, evicting the least recently seen beyond the size limit"""
+        self.processed_transaction_ids[transaction_id] = None
+        self.processed_transaction_ids.move_to_end(transaction_id)
+        if len(self.processed_transaction_ids) > PROCESSED_CACHE_MAX_SIZE:
+            self.processed_transaction_ids.popitem(last=False)
     
     async def get_db_config(self) -> Optional[Dict[str, Any]]:
         """Get database configuration from the database"""
@@ -78,32 +185,118 @@ class LamassuTransactionProcessor:
             logger.error(f"Error getting database configuration: {e}")
             return None
     
-    def setup_ssh_tunnel(self, db_config: Dict[str, Any]) -> Optional[Dict[str, Any]]:
-        """Setup SSH tunnel if required and return modified connection config"""
-        if not db_config.get("use_ssh_tunnel"):
-            return db_config
-            
-        if not SSH_AVAILABLE:
-            logger.error("SSH tunnel requested but SSH libraries not available")
-            return None
+    async def setup_ssh_tunnel(self, db_config: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Setup SSH tunnel if required, open the connection pool and return the connection config"""
+        # Only called through ensure_connection_pool, which holds connection_lock
+        # Close existing tunnel and pool if any
+        await self.close_ssh_tunnel()
+        
+        if db_config.get("use_ssh_tunnel"):
+            # Either asyncssh or the ssh command line tool (via subprocess) can build the tunnel
+            try:
+                if ASYNCSSH_AVAILABLE:
+                    connection_config = await self._setup_asyncssh_tunnel(db_config)
+                else:
+                    # Use subprocess-based SSH tunnel as fallback
+                    connection_config = await self._setup_subprocess_ssh_tunnel(db_config)
+            except Exception as e:
+                logger.error(f"Failed to setup SSH tunnel: {e}")
+                connection_config = None
             
+            if not connection_config:
+                await self.close_ssh_tunnel()
+                return None
+        else:
+            connection_config = db_config
+        
+        # Open a persistent connection pool so queries skip the connect/auth handshake
+        # Kept for the odd dedicated connection outside the pool (the poll index build)
+        connect_params = {
+            "host": connection_config["host"],
+            "port": connection_config["port"],
+            "user": connection_config["user"],
+            "password": connection_config["password"],
+            "database": connection_config["database"],
+        }
         try:
-            # Close existing tunnel if any
-            self.close_ssh_tunnel()
-            
-            # Use subprocess-based SSH tunnel as fallback
-            return self._setup_subprocess_ssh_tunnel(db_config)
-            
+            self.pool = await asyncpg.create_pool(
+                **connect_params,
+                min_size=LAMASSU_POOL_MIN_SIZE,
+                max_size=LAMASSU_POOL_MAX_SIZE,
+                max_inactive_connection_lifetime=300,
+                command_timeout=60
+            )
         except Exception as e:
-            logger.error(f"Failed to setup SSH tunnel: {e}")
-            self.close_ssh_tunnel()
+            logger.error(f"Failed to create Lamassu database connection pool: {e}")
+            await self.close_ssh_tunnel()
             return None
+        
+        self.pool_config_key = self._connection_key(db_config)
+        self.connect_params = connect_params
+        logger.info(f"Lamassu database pool ready on {connection_config['host']}:{connection_config['port']}")
+        return connection_config
     
-    def _setup_subprocess_ssh_tunnel(self, db_config: Dict[str, Any]) -> Optional[Dict[str, Any]]:
-        """Setup SSH tunnel using subprocess (compatible with all environments)"""
-        import subprocess
-        import socket
+    async def ensure_connection_pool(self, db_config: Dict[str, Any]) -> bool:
+        """Reuse the open pool unless the tunnel died or the configuration changed"""
+        async with self.connection_lock:
+            tunnel_alive = (
+                (self.ssh_process is None or self.ssh_process.returncode is None)
+                and (self.ssh_conn is None or not self.ssh_conn.is_closed())
+            )
+            if (
+                self.pool is not None
+                and tunnel_alive
+                and self.pool_config_key == self._connection_key(db_config)
+            ):
+                return True
+            return await self.setup_ssh_tunnel(db_config) is not None
+    
+    @staticmethod
+    def _connection_key(db_config: Dict[str, Any]) -> tuple:
+        """Connection settings that require a new tunnel/pool when changed"""
+        return tuple(db_config.get(key) for key in (
+            "host", "port", "database", "user", "password", "use_ssh_tunnel",
+            "ssh_host", "ssh_port", "ssh_username", "ssh_password", "ssh_private_key"
+        ))
+    
+    async def _setup_asyncssh_tunnel(self, db_config: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Setup SSH tunnel using asyncssh port forwarding (event-driven, no subprocess)"""
+        connect_options: Dict[str, Any] = {
+            "port": db_config['ssh_port'],
+            "username": db_config['ssh_username'],
+            "known_hosts": None,
+            "connect_timeout": 10,
+            "keepalive_interval": 60
+        }
         
+        # Add authentication method
+        if db_config.get("ssh_password"):
+            connect_options["password"] = db_config["ssh_password"]
+        elif db_config.get("ssh_private_key"):
+            connect_options["client_keys"] = [asyncssh.import_private_key(db_config["ssh_private_key"])]
+        else:
+            logger.error("SSH tunnel requires either private key or password")
+            return None
+        
+        self.ssh_conn = await asyncssh.connect(db_config['ssh_host'], **connect_options)
+        
+        # Port 0 lets the OS pick a free local port; the listener is ready once this returns
+        self.ssh_listener = await self.ssh_conn.forward_local_port(
+            '127.0.0.1', 0, db_config['host'], db_config['port']
+        )
+        local_port = self.ssh_listener.get_port()
+        
+        logger.info(f"SSH tunnel established: localhost:{local_port} -> {db_config['ssh_host']}:{db_config['ssh_port']} -> {db_config['host']}:{db_config['port']}")
+        
+        # Return modified config to connect through tunnel
+        tunnel_config = db_config.copy()
+        tunnel_config["host"] = "127.0.0.1"
+        tunnel_config["port"] = local_port
+        
+        return tunnel_config
+    
+    async def _setup_subprocess_ssh_tunnel(self, db_config: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Setup SSH tunnel using subprocess (compatible with all environments)"""
         # Find an available local port
         with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
             s.bind(('', 0))
@@ -126,91 +319,47 @@ class LamassuTransactionProcessor:
         # Add authentication method
         if db_config.get("ssh_password"):
             # Check if sshpass is available for password authentication
-            try:
-                import subprocess
-                subprocess.run(["which", "sshpass"], check=True, capture_output=True)
-                ssh_cmd = ["sshpass", "-p", db_config["ssh_password"]] + ssh_cmd
-            except subprocess.CalledProcessError:
+            if not _has_sshpass():
                 logger.error("Password authentication requires 'sshpass' tool which is not installed. Please use SSH key authentication instead.")
                 return None
+            ssh_cmd = ["sshpass", "-p", db_config["ssh_password"]] + ssh_cmd
         elif db_config.get("ssh_private_key"):
-            # Write private key and SSH config to temporary files
-            import tempfile
-            import os
-            key_fd, key_path = tempfile.mkstemp(suffix='.pem')
-            config_fd, config_path = tempfile.mkstemp(suffix='.ssh_config')
-            try:
-                # Prepare key content with proper line endings and final newline
-                key_data = db_config["ssh_private_key"]
-                key_data = key_data.replace('\r\n', '\n').replace('\r', '\n')  # Normalize line endings
-                if not key_data.endswith('\n'):
-                    key_data += '\n'  # Ensure newline at end of file
-
-                with os.fdopen(key_fd, 'w', encoding='utf-8') as f:
-                    f.write(key_data)
-
-                os.chmod(key_path, 0o600)
-
-                # Create temporary SSH config file with strict settings
-                ssh_config = f"""Host {db_config['ssh_host']}
-    HostName {db_config['ssh_host']}
-    Port {db_config['ssh_port']}
-    User {db_config['ssh_username']}
-    IdentityFile {key_path}
-    IdentitiesOnly yes
-    PasswordAuthentication no
-    PubkeyAuthentication yes
-    PreferredAuthentications publickey
-    NumberOfPasswordPrompts 0
-    IdentityAgent none
-    ControlMaster no
-    ControlPath none
-    StrictHostKeyChecking no
-    UserKnownHostsFile /dev/null
-    LogLevel ERROR
-    ConnectTimeout 10
-    ServerAliveInterval 60
-"""
-                
-                with os.fdopen(config_fd, 'w', encoding='utf-8') as f:
-                    f.write(ssh_config)
-                
-                os.chmod(config_path, 0o600)
-
-                # Use the custom config file
-                ssh_cmd.extend([
-                    "-F", config_path,
-                    db_config['ssh_host']
-                ])
-                print(ssh_cmd)
-
-                self.ssh_key_path = key_path  # Store for cleanup
-                self.ssh_config_path = config_path  # Store for cleanup
-            except Exception as e:
-                os.unlink(key_path)
-                if 'config_path' in locals():
-                    os.unlink(config_path)
-                raise e
+            # Use the custom config file pointing at the written private key
+            _, config_path = await self._ensure_ssh_identity(db_config)
+            ssh_cmd.extend([
+                "-F", config_path,
+                db_config['ssh_host']
+            ])
         else:
             logger.error("SSH tunnel requires either private key or password")
             return None
         
         # Start SSH tunnel process
         try:
-            self.ssh_process = subprocess.Popen(
-                ssh_cmd,
+            self.ssh_process = await asyncio.create_subprocess_exec(
+                *ssh_cmd,
                 stdout=subprocess.DEVNULL,
                 stderr=subprocess.DEVNULL,
                 stdin=subprocess.DEVNULL
             )
             
-            # Wait a moment for tunnel to establish
-            import time
-            time.sleep(2)
-            
-            # Check if process is still running
-            if self.ssh_process.poll() is not None:
-                raise Exception("SSH tunnel process terminated immediately")
+            # Wait until the forwarded port accepts connections instead of sleeping a fixed time
+            deadline = time.monotonic() + 5
+            while time.monotonic() < deadline:
+                # Check if process is still running
+                if self.ssh_process.returncode is not None:
+                    raise Exception("SSH tunnel process terminated immediately")
+                try:
+                    _, writer = await asyncio.wait_for(
+                        asyncio.open_connection('127.0.0.1', local_port), 0.1
+                    )
+                    writer.close()
+                    await writer.wait_closed()
+                    break
+                except (OSError, asyncio.TimeoutError):
+                    await asyncio.sleep(0.05)
+            else:
+                raise Exception("SSH tunnel never accepted connections")
             
             logger.info(f"SSH tunnel established: localhost:{local_port} -> {db_config['ssh_host']}:{db_config['ssh_port']} -> {db_config['host']}:{db_config['port']}")
             
@@ -228,13 +377,117 @@ class LamassuTransactionProcessor:
             logger.error(f"Failed to establish SSH tunnel: {e}")
             return None
     
-    def close_ssh_tunnel(self):
-        """Close SSH tunnel if active"""
+    async def _ensure_ssh_identity(self, db_config: Dict[str, Any]) -> tuple:
+        """Write the SSH private key and config to temporary files once and reuse them until the tunnel is closed"""
+        if (
+            self.ssh_key_path and self.ssh_config_path
+            and os.path.exists(self.ssh_key_path) and os.path.exists(self.ssh_config_path)
+        ):
+            return self.ssh_key_path, self.ssh_config_path
+        
+        # Blocking file I/O runs in a worker thread so it never stalls the event loop
+        key_path, config_path = await asyncio.get_running_loop().run_in_executor(
+            None, self._write_ssh_identity, db_config
+        )
+        self.ssh_key_path = key_path  # Store for cleanup
+        self.ssh_config_path = config_path  # Store for cleanup
+        return key_path, config_path
+    
+    @staticmethod
+    def _write_ssh_identity(db_config: Dict[str, Any]) -> tuple:
+        """Write the SSH private key and config to new temporary files (blocking)"""
+        key_fd, key_path = tempfile.mkstemp(suffix='.pem')
+        config_fd, config_path = tempfile.mkstemp(suffix='.ssh_config')
+        try:
+            # Prepare key content with proper line endings and final newline
+            key_data = db_config["ssh_private_key"]
+            key_data = key_data.replace('\r\n', '\n').replace('\r', '\n')  # Normalize line endings
+            if not key_data.endswith('\n'):
+                key_data += '\n'  # Ensure newline at end of file
+
+            with os.fdopen(key_fd, 'w', encoding='utf-8') as f:
+                f.write(key_data)
+
+            os.chmod(key_path, 0o600)
+
+            # Create temporary SSH config file with strict settings
+            ssh_config = f"""Host {db_config['ssh_host']}
+    HostName {db_config['ssh_host']}
+    Port {db_config['ssh_port']}
+    User {db_config['ssh_username']}
+    IdentityFile {key_path}
+    IdentitiesOnly yes
+    PasswordAuthentication no
+    PubkeyAuthentication yes
+    PreferredAuthentications publickey
+    NumberOfPasswordPrompts 0
+    IdentityAgent none
+    ControlMaster no
+    ControlPath none
+    StrictHostKeyChecking no
+    UserKnownHostsFile /dev/null
+    LogLevel ERROR
+    ConnectTimeout 10
+    ServerAliveInterval 60
+"""
+            
+            with os.fdopen(config_fd, 'w', encoding='utf-8') as f:
+                f.write(ssh_config)
+            
+            os.chmod(config_path, 0o600)
+        except Exception as e:
+            os.unlink(key_path)
+            os.unlink(config_path)
+            raise e
+        
+        return key_path, config_path
+    
+    async def shutdown(self) -> None:
+        """Stop background work and close the pool and tunnel (removing the temporary SSH key) on extension stop"""
+        if self.poll_index_task is not None:
+            self.poll_index_task.cancel()
+        async with self.connection_lock:
+            await self.close_ssh_tunnel()
+    
+    async def close_ssh_tunnel(self):
+        """Close connection pool and SSH tunnel if active"""
+        # Close the connection pool before tearing down the tunnel underneath it
+        if self.pool is not None:
+            try:
+                await self.pool.close()
+                logger.info("Lamassu database pool closed")
+            except Exception as e:
+                logger.warning(f"Error closing Lamassu database pool: {e}")
+            finally:
+                self.pool = None
+                self.pool_config_key = None
+                self.connect_params = None
+        
+        # Close asyncssh-based tunnel
+        if self.ssh_listener is not None:
+            try:
+                self.ssh_listener.close()
+                await self.ssh_listener.wait_closed()
+            except Exception as e:
+                logger.warning(f"Error closing SSH port forward: {e}")
+            finally:
+                self.ssh_listener = None
+        
+        if self.ssh_conn is not None:
+            try:
+                self.ssh_conn.close()
+                await self.ssh_conn.wait_closed()
+                logger.info("SSH tunnel connection closed")
+            except Exception as e:
+                logger.warning(f"Error closing SSH tunnel connection: {e}")
+            finally:
+                self.ssh_conn = None
+        
         # Close subprocess-based tunnel
         if hasattr(self, 'ssh_process') and self.ssh_process:
             try:
                 self.ssh_process.terminate()
-                self.ssh_process.wait(timeout=5)
+                await asyncio.wait_for(self.ssh_process.wait(), timeout=5)
                 logger.info("SSH tunnel process closed")
             except Exception as e:
                 logger.warning(f"Error closing SSH tunnel process: {e}")
@@ -248,7 +501,6 @@ class LamassuTransactionProcessor:
         # Clean up temporary key file if exists
         if hasattr(self, 'ssh_key_path') and self.ssh_key_path:
             try:
-                import os
                 os.unlink(self.ssh_key_path)
                 logger.info("SSH key file cleaned up")
             except Exception as e:
@@ -259,7 +511,6 @@ class LamassuTransactionProcessor:
         # Clean up temporary SSH config file if exists
         if hasattr(self, 'ssh_config_path') and self.ssh_config_path:
             try:
-                import os
                 os.unlink(self.ssh_config_path)
                 logger.info("SSH config file cleaned up")
             except Exception as e:
@@ -296,13 +547,7 @@ class LamassuTransactionProcessor:
                 result["ssh_tunnel_used"] = True
                 result["steps"].append("Setting up SSH tunnel...")
                 
-                if not SSH_AVAILABLE:
-                    result["message"] = "SSH tunnel required but SSH support not available"
-                    result["steps"].append("❌ SSH support missing (requires ssh command line tool)")
-                    return result
-                
-                connection_config = self.setup_ssh_tunnel(db_config)
-                if not connection_config:
+                if not await self.ensure_connection_pool(db_config):
                     result["message"] = "Failed to establish SSH tunnel"
                     result["steps"].append("❌ SSH tunnel failed - check SSH credentials and server accessibility")
                     return result
@@ -310,16 +555,19 @@ class LamassuTransactionProcessor:
                 result["ssh_tunnel_success"] = True
                 result["steps"].append(f"✅ SSH tunnel established to {db_config['ssh_host']}:{db_config['ssh_port']}")
             else:
-                connection_config = db_config
                 result["steps"].append("ℹ️  Direct database connection (no SSH tunnel)")
+                if not await self.ensure_connection_pool(db_config):
+                    result["message"] = "Failed to connect to database"
+                    result["steps"].append("❌ Database connection failed - check host, port and credentials")
+                    return result
             
-            # Step 3: Test SSH-based database query
-            result["steps"].append("Testing database query via SSH...")
+            # Step 3: Test database query through the connection pool
+            result["steps"].append("Testing database query...")
             test_query = "SELECT 1 as test"
             test_results = await self.execute_ssh_query(db_config, test_query)
             
             if not test_results:
-                result["message"] = "SSH connection succeeded but database query failed"
+                result["message"] = "Connection succeeded but database query failed"
                 result["steps"].append("❌ Database query test failed")
                 return result
             
@@ -339,6 +587,26 @@ class LamassuTransactionProcessor:
             count = table_results[0].get('count', 0)
             result["steps"].append(f"✅ Table access successful (found {count} transactions)")
             
+            # Check that the poll query is served by the partial index
+            result["steps"].append("Checking poll query plan...")
+            plan_query = """
+            EXPLAIN (ANALYZE, BUFFERS)
+            SELECT co.id FROM cash_out_txs co
+            WHERE co.confirmed_at > now() - interval '1 day'
+                AND co.dispense
+                AND co.dispense_confirmed
+            """
+            plan_results = await self.execute_ssh_query(db_config, plan_query)
+            if plan_results:
+                plan = "\n".join(row[0] for row in plan_results)
+                logger.info(f"Lamassu poll query plan:\n{plan}")
+                if "idx_cashout_poll" in plan:
+                    result["steps"].append("✅ Poll query uses index idx_cashout_poll")
+                else:
+                    result["steps"].append("⚠️ Poll query does not use idx_cashout_poll (created on first poll)")
+            else:
+                result["steps"].append("⚠️ Could not read poll query plan")
+            
             # Step 5: Check database timezone
             result["steps"].append("Checking database timezone...")
             timezone_query = "SELECT NOW() as db_time, EXTRACT(timezone FROM NOW()) as timezone_offset"
@@ -396,240 +664,177 @@ class LamassuTransactionProcessor:
             logger.error(f"Failed to get database configuration: {e}")
             return None
     
-    async def execute_ssh_query(self, db_config: Dict[str, Any], query: str) -> List[Dict[str, Any]]:
-        """Execute a query via SSH connection"""
-        import subprocess
-        import json
-        import asyncio
-        
+    async def execute_ssh_query(self, db_config: Dict[str, Any], query: str, *args: Any) -> List[asyncpg.Record]:
+        """Execute a query on the Lamassu database through the pooled (tunnelled) connection"""
         try:
-            # Build SSH command to execute the query
-            ssh_cmd = [
-                "ssh",
-                f"{db_config['ssh_username']}@{db_config['ssh_host']}",
-                "-p", str(db_config['ssh_port']),
-                "-o", "StrictHostKeyChecking=no",
-                "-o", "UserKnownHostsFile=/dev/null",
-                "-o", "LogLevel=ERROR"
-            ]
-            
-            # Add key authentication if provided
-            if db_config.get("ssh_private_key"):
-                import tempfile
-                import os
-                key_fd, key_path = tempfile.mkstemp(suffix='.pem')
-                config_fd, config_path = tempfile.mkstemp(suffix='.ssh_config')
-                try:
-                    # Prepare key content with proper line endings and final newline
-                    key_data = db_config["ssh_private_key"]
-                    key_data = key_data.replace('\r\n', '\n').replace('\r', '\n')  # Normalize line endings
-                    if not key_data.endswith('\n'):
-                        key_data += '\n'  # Ensure newline at end of file
-
-                    with os.fdopen(key_fd, 'w', encoding='utf-8') as f:
-                        f.write(key_data)
-                    os.chmod(key_path, 0o600)
-
-                    # Create temporary SSH config file with strict settings
-                    ssh_config = f"""Host {db_config['ssh_host']}
-    HostName {db_config['ssh_host']}
-    Port {db_config['ssh_port']}
-    User {db_config['ssh_username']}
-    IdentityFile {key_path}
-    IdentitiesOnly yes
-    PasswordAuthentication no
-    PubkeyAuthentication yes
-    PreferredAuthentications publickey
-    NumberOfPasswordPrompts 0
-    IdentityAgent none
-    ControlMaster no
-    ControlPath none
-    StrictHostKeyChecking no
-    UserKnownHostsFile /dev/null
-    LogLevel ERROR
-    ConnectTimeout 10
-    ServerAliveInterval 60
-"""
-                    
-                    with os.fdopen(config_fd, 'w', encoding='utf-8') as f:
-                        f.write(ssh_config)
-                    os.chmod(config_path, 0o600)
-
-                    # Use the custom config file
-                    ssh_cmd = [
-                        "ssh",
-                        "-F", config_path,
-                        db_config['ssh_host']
-                    ]
-                    
-                    # Build the psql command to return JSON
-                    psql_cmd = f"psql {db_config['database']} -t -c \"COPY ({query}) TO STDOUT WITH CSV HEADER\""
-                    ssh_cmd.append(psql_cmd)
-                    
-                    # Execute the command
-                    process = await asyncio.create_subprocess_exec(
-                        *ssh_cmd,
-                        stdout=subprocess.PIPE,
-                        stderr=subprocess.PIPE
-                    )
-                    
-                    stdout, stderr = await process.communicate()
-                    
-                    if process.returncode != 0:
-                        logger.error(f"SSH query failed: {stderr.decode()}")
-                        return []
-                    
-                    # Parse CSV output
-                    import csv
-                    import io
-                    
-                    csv_data = stdout.decode()
-                    if not csv_data.strip():
-                        return []
-                    
-                    reader = csv.DictReader(io.StringIO(csv_data))
-                    results = []
-                    for row in reader:
-                        # Convert string values to appropriate types
-                        processed_row = {}
-                        for key, value in row.items():
-                            if value == '':
-                                processed_row[key] = None
-                            elif key in ['transaction_id', 'device_id', 'crypto_code', 'fiat_code']:
-                                processed_row[key] = str(value)
-                            elif key in ['fiat_amount', 'crypto_amount']:
-                                processed_row[key] = int(float(value)) if value else 0
-                            elif key in ['commission_percentage', 'discount']:
-                                processed_row[key] = float(value) if value else 0.0
-                            elif key == 'transaction_time':
-                                from datetime import datetime
-                                # Parse timestamp and ensure it's in UTC for consistency
-                                dt = datetime.fromisoformat(value.replace('Z', '+00:00'))
-                                # Convert to UTC if not already
-                                if dt.tzinfo is None:
-                                    # Assume UTC if no timezone info
-                                    dt = dt.replace(tzinfo=timezone.utc)
-                                elif dt.tzinfo != timezone.utc:
-                                    # Convert to UTC
-                                    dt = dt.astimezone(timezone.utc)
-                                processed_row[key] = dt
-                            else:
-                                processed_row[key] = value
-                        results.append(processed_row)
-                    
-                    return results
-                    
-                finally:
-                    os.unlink(key_path)
-                    if 'config_path' in locals():
-                        os.unlink(config_path)
-                    
-            else:
-                logger.error("SSH private key required for database queries")
+            if not await self.ensure_connection_pool(db_config):
+                logger.error("Lamassu database connection pool is not available")
                 return []
+            
+            # Records already support row["col"] / row.get("col"), so no per-row dict is built
+            async with self.pool.acquire() as conn:
+                return await conn.fetch(query, *args)
                 
         except Exception as e:
-            logger.error(f"Error executing SSH query: {e}")
+            logger.error(f"Error executing Lamassu query: {e}")
             return []
     
-    async def fetch_new_transactions(self, db_config: Dict[str, Any]) -> List[Dict[str, Any]]:
-        """Fetch new successful transactions from Lamassu database since last poll"""
+    def ensure_poll_index(self, db_config: Dict[str, Any]) -> None:
+        """Start building the partial index backing the poll query on the Lamassu database (once per process)"""
+        # The build can take minutes on a large cash_out_txs, so it runs in the background instead of
+        # holding up the poll (which works without the index, only slower)
+        if self.poll_index_checked or (self.poll_index_task is not None and not self.poll_index_task.done()):
+            return
+        self.poll_index_task = asyncio.create_task(self._build_poll_index(db_config))
+    
+    async def _build_poll_index(self, db_config: Dict[str, Any]) -> None:
+        """Create idx_cashout_poll, rebuilding it when an interrupted build left it invalid"""
         try:
-            # Determine the time threshold based on last successful poll
-            config = await get_active_lamassu_config()
-            if config and config.last_successful_poll:
-                # Use last successful poll time
-                time_threshold = config.last_successful_poll
-                logger.info(f"Checking for transactions since last successful poll: {time_threshold}")
-            else:
-                # Fallback to last 24 hours for first run or if no previous poll
-                time_threshold = datetime.now(timezone.utc) - timedelta(hours=24)
-                logger.info(f"No previous poll found, checking last 24 hours since: {time_threshold}")
-            
-            # Convert to UTC if not already timezone-aware
-            if time_threshold.tzinfo is None:
-                time_threshold = time_threshold.replace(tzinfo=timezone.utc)
-            elif time_threshold.tzinfo != timezone.utc:
-                time_threshold = time_threshold.astimezone(timezone.utc)
-            
-            # Format as UTC for database query
-            time_threshold_str = time_threshold.strftime('%Y-%m-%d %H:%M:%S UTC')
-            
-            # First, get all transactions since the threshold from Lamassu database
-            # Filter out unconfirmed dispenses
-            # TODO: review
-            lamassu_query = f"""
-            SELECT 
-                co.id as transaction_id,
-                co.fiat as fiat_amount,
-                co.crypto_atoms as crypto_amount,
-                co.confirmed_at as transaction_time,
-                co.device_id,
-                co.status,
-                co.commission_percentage,
-                co.discount,
-                co.crypto_code,
-                co.fiat_code
-            FROM cash_out_txs co
-            WHERE co.confirmed_at > '{time_threshold_str}'
-                AND co.status IN ('confirmed', 'authorized')
-                AND co.dispense = 't'
-                AND co.dispense_confirmed = 't'
-            ORDER BY co.confirmed_at DESC
-            """
-            
-            all_transactions = await self.execute_ssh_query(db_config, lamassu_query)
-            
-            # Then filter out already processed transactions using our local database
-            from .crud import get_all_payments
-            processed_payments = await get_all_payments()
-            processed_transaction_ids = {
-                payment.lamassu_transaction_id 
-                for payment in processed_payments 
-                if payment.lamassu_transaction_id
-            }
-            
-            # Filter out already processed transactions
-            new_transactions = [
-                tx for tx in all_transactions 
-                if tx['transaction_id'] not in processed_transaction_ids
-            ]
-            
-            logger.info(f"Found {len(all_transactions)} total transactions since {time_threshold}, {len(new_transactions)} are new")
-            return new_transactions
-            
+            if not await self.ensure_connection_pool(db_config):
+                # No connection yet - try again on the next poll
+                return
+            # A dedicated connection without the pool's command_timeout: asyncpg would cancel a long build
+            # part-way (a per-call timeout=None falls back to command_timeout), leaving the index invalid
+            conn = await asyncpg.connect(**self.connect_params, command_timeout=None)
+            try:
+                # NULL when the index does not exist, false when an earlier build was interrupted
+                index_valid = await conn.fetchval(
+                    """
+                    SELECT indisvalid FROM pg_index
+                    WHERE indexrelid = to_regclass('idx_cashout_poll')
+                    """
+                )
+                if index_valid:
+                    self.poll_index_checked = True
+                    logger.info("Lamassu poll index idx_cashout_poll is in place")
+                    return
+                if index_valid is False:
+                    # IF NOT EXISTS would skip an invalid index that the planner can never use
+                    # but the ATM's writes still have to maintain
+                    logger.warning("Lamassu poll index idx_cashout_poll is invalid - rebuilding it")
+                    await conn.execute("DROP INDEX CONCURRENTLY IF EXISTS idx_cashout_poll")
+                
+                # CONCURRENTLY avoids locking cash_out_txs against the ATM's writes while the index builds
+                await conn.execute(
+                    """
+                    CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_cashout_poll
+                    ON cash_out_txs (confirmed_at)
+                    WHERE dispense AND dispense_confirmed
+                    """
+                )
+            finally:
+                await conn.close()
+            self.poll_index_checked = True
+            logger.info("Lamassu poll index idx_cashout_poll created")
+        except asyncpg.PostgresError as e:
+            # The database refused (e.g. no privilege to create indexes) - don't retry on every poll
+            self.poll_index_checked = True
+            logger.warning(f"Could not create Lamassu poll index (polling still works without it): {e}")
         except Exception as e:
-            logger.error(f"Error fetching transactions from Lamassu database: {e}")
-            return []
+            logger.warning(f"Could not create Lamassu poll index, retrying on the next poll: {e}")
     
-    async def calculate_distribution_amounts(self, transaction: Dict[str, Any]) -> Dict[str, int]:
+    async def fetch_new_transactions(self, db_config: Dict[str, Any], config: Optional[LamassuConfig] = None) -> AsyncIterator[LamassuRow]:
+        """Stream new successful transactions from Lamassu database since last poll"""
+        # Errors are not swallowed here: a failure part-way through the stream must reach the caller
+        # so the poll is not recorded as successful and the watermark is not advanced
+        
+        # Determine the time threshold based on the newest transaction of earlier polls
+        if config is None:
+            config = await get_active_lamassu_config()
+        if config and config.poll_watermark:
+            # Use the poll watermark
+            time_threshold = config.poll_watermark
+            logger.info(f"Checking for transactions since poll watermark: {time_threshold}")
+        else:
+            # Fallback to last 24 hours for first run or if no previous poll
+            time_threshold = datetime.now(timezone.utc) - timedelta(hours=24)
+            logger.info(f"No previous poll found, checking last 24 hours since: {time_threshold}")
+        
+        # Convert to UTC if not already timezone-aware
+        time_threshold = _to_utc(time_threshold)
+        
+        # Transactions already paid out are excluded on the Lamassu side so only new rows
+        # come back over the tunnel (payments live in a different database, so pass the IDs).
+        # The local lookup and the tunnel/pool (re)connect are independent, so overlap them.
+        processed_transaction_ids, pool_ready = await asyncio.gather(
+            get_processed_lamassu_transaction_ids(time_threshold),
+            self.ensure_connection_pool(db_config)
+        )
+        if not pool_ready:
+            logger.error("Lamassu database connection pool is not available")
+            return
+        
+        # Get new transactions since the threshold from Lamassu database
+        # Filter out unconfirmed dispenses, non-BTC cash-outs and zero-fiat rows on the Lamassu side
+        # Oldest first (walking idx_cashout_poll) so payouts follow the order the cash was dispensed
+        # Parameters are bound (not interpolated) so asyncpg can reuse the prepared statement
+        # Each column is cast/defaulted here so asyncpg decodes it straight to the Python type
+        # the processor expects (no per-row coercion in Python)
+        # TODO: review
+        lamassu_query = """
+        SELECT 
+            co.id::text as transaction_id,
+            trunc(co.fiat)::bigint as fiat_amount,
+            co.crypto_atoms::bigint as crypto_amount,
+            co.confirmed_at as transaction_time,
+            co.device_id,
+            co.status,
+            COALESCE(co.commission_percentage, 0)::float8 as commission_percentage,
+            COALESCE(co.discount, 0)::float8 as discount,
+            co.crypto_code,
+            co.fiat_code
+        FROM cash_out_txs co
+        WHERE co.confirmed_at > $1
+            AND co.status::text = ANY($2::text[])
+            AND co.dispense
+            AND co.dispense_confirmed
+            AND co.crypto_code = 'BTC'
+            AND co.fiat > 0
+            AND NOT (co.id::text = ANY($3::text[]))
+        ORDER BY co.confirmed_at ASC
+        """
+        
+        # Stream through a server-side cursor so large catch-up polls never hold the whole
+        # result set in memory and processing starts as soon as the first rows arrive
+        fetched_count = 0
+        async with self.pool.acquire() as conn:
+            async with conn.transaction(readonly=True):
+                async for record in conn.cursor(
+                    lamassu_query,
+                    time_threshold,
+                    ["confirmed", "authorized"],
+                    processed_transaction_ids,
+                    prefetch=FETCH_PREFETCH_ROWS
+                ):
+                    fetched_count += 1
+                    # Matched by column name so reordering the select list cannot swap same-typed fields
+                    yield LamassuRow(**record)
+        
+        logger.info(f"Found {fetched_count} new transactions since {time_threshold} ({len(processed_transaction_ids)} already processed)")
+    
+    async def calculate_distribution_amounts(self, transaction: LamassuRow, flow_clients: Optional[List[DcaClient]] = None, economics: Optional[TxEconomics] = None) -> Dict[str, int]:
         """Calculate how much each Flow Mode client should receive"""
         try:
-            # Get all active Flow Mode clients
-            flow_clients = await get_flow_mode_clients()
+            # Get all active Flow Mode clients (unless prefetched once for the whole poll batch)
+            if flow_clients is None:
+                flow_clients = await get_flow_mode_clients()
             
             if not flow_clients:
                 logger.info("No Flow Mode clients found - skipping distribution")
                 return {}
             
             # Extract transaction details with None-safe defaults
-            crypto_atoms = transaction.get("crypto_amount")  # Total sats with commission baked in
-            fiat_amount = transaction.get("fiat_amount")     # Actual fiat dispensed (principal only)
-            commission_percentage = transaction.get("commission_percentage")  # Already stored as decimal (e.g., 0.045)
-            discount = transaction.get("discount")  # Discount percentage
-            transaction_time = transaction.get("transaction_time")  # ATM transaction timestamp for temporal accuracy
+            crypto_atoms = transaction.crypto_amount  # Total sats with commission baked in
+            fiat_amount = transaction.fiat_amount     # Actual fiat dispensed (principal only)
+            commission_percentage = transaction.commission_percentage  # Already stored as decimal (e.g., 0.045)
+            discount = transaction.discount  # Discount percentage
+            transaction_time = transaction.transaction_time  # ATM transaction timestamp for temporal accuracy
             
             # Normalize transaction_time to UTC if present
             if transaction_time is not None:
                 if transaction_time.tzinfo is None:
-                    # Assume UTC if no timezone info
-                    transaction_time = transaction_time.replace(tzinfo=timezone.utc)
                     logger.warning("Transaction time was timezone-naive, assuming UTC")
-                elif transaction_time.tzinfo != timezone.utc:
-                    # Convert to UTC
-                    original_tz = transaction_time.tzinfo
-                    transaction_time = transaction_time.astimezone(timezone.utc)
-                    logger.info(f"Converted transaction time from {original_tz} to UTC")
+                transaction_time = _to_utc(transaction_time)
             
             # Validate required fields
             if crypto_atoms is None:
@@ -649,27 +854,26 @@ class LamassuTransactionProcessor:
                 # Could use current time as fallback, but this indicates a data issue
                 # transaction_time = datetime.now(timezone.utc)
             
-            # Calculate effective commission percentage after discount (following the reference logic)
-            if commission_percentage > 0:
-                effective_commission = commission_percentage * (100 - discount) / 100
-                # Since crypto_atoms already includes commission, we need to extract the base amount
-                # Formula: crypto_atoms = base_amount * (1 + effective_commission)
-                # Therefore: base_amount = crypto_atoms / (1 + effective_commission)
-                base_crypto_atoms = int(crypto_atoms / (1 + effective_commission))
-                commission_amount_sats = crypto_atoms - base_crypto_atoms
-            else:
-                effective_commission = 0.0
-                base_crypto_atoms = crypto_atoms
-                commission_amount_sats = 0
-            
-            # Calculate exchange rate based on base amounts
-            exchange_rate = base_crypto_atoms / fiat_amount if fiat_amount > 0 else 0  # sats per fiat unit
-            
-            logger.info(f"Transaction - Total crypto: {crypto_atoms} sats")
-            logger.info(f"Commission: {commission_percentage*100:.1f}% - {discount:.1f}% discount = {effective_commission*100:.1f}% effective ({commission_amount_sats} sats)")
-            logger.info(f"Base for DCA: {base_crypto_atoms} sats, Fiat dispensed: {fiat_amount}, Exchange rate: {exchange_rate:.2f} sats/fiat_unit")
+            # Extract the base amount and commission (crypto_atoms already includes the commission)
+            if economics is None:
+                economics = compute_economics(transaction)
+            base_crypto_atoms = economics.base_sats
+            commission_amount_sats = economics.commission_sats
+            effective_commission = economics.effective_commission
+            exchange_rate = economics.exchange_rate
+            
+            # Hot-path log calls pass their values as arguments: loguru only formats them when the level is enabled
+            logger.info("Transaction - Total crypto: {} sats", crypto_atoms)
+            logger.info(
+                "Commission: {:.1%} - {:.1f}% discount = {:.1%} effective ({} sats)",
+                commission_percentage, discount, effective_commission, commission_amount_sats
+            )
+            logger.info(
+                "Base for DCA: {} sats, Fiat dispensed: {}, Exchange rate: {:.2f} sats/fiat_unit",
+                base_crypto_atoms, fiat_amount, exchange_rate
+            )
             if transaction_time:
-                logger.info(f"Calculating balances as of transaction time: {transaction_time}")
+                logger.info("Calculating balances as of transaction time: {}", transaction_time)
             else:
                 logger.warning("No transaction time available - using current balances (may be inaccurate)")
             
@@ -677,30 +881,33 @@ class LamassuTransactionProcessor:
             client_balances = {}
             total_confirmed_deposits = 0
             
-            for client in flow_clients:
-                # Get balance as of the transaction time for temporal accuracy
-                balance = await get_client_balance_summary(client.id, as_of_time=transaction_time)
+            # Get all balances as of the transaction time for temporal accuracy in one round trip
+            balances = await get_client_balances_bulk([client.id for client in flow_clients], as_of_time=transaction_time)
+            for client_id, balance in balances.items():
                 if balance.remaining_balance > 0:  # Only include clients with remaining balance
-                    client_balances[client.id] = balance.remaining_balance
+                    client_balances[client_id] = balance.remaining_balance
                     total_confirmed_deposits += balance.remaining_balance
             
             if total_confirmed_deposits == 0:
                 logger.info("No clients with remaining DCA balance - skipping distribution")
                 return {}
             
+            # Split the base crypto (after commission) in proportion to the remaining balances
+            client_sats = apportion_sats(base_crypto_atoms, client_balances)
+            # The fiat value is what client balances are charged with, so it is apportioned the same way:
+            # rounding each share on its own would not add back up to the fiat dispensed
+            client_fiats = apportion_sats(fiat_amount, client_balances)
+            
             # Calculate proportional distribution
             distributions = {}
             
             for client_id, client_balance in client_balances.items():
-                # Calculate this client's proportion of the total DCA pool
-                proportion = client_balance / total_confirmed_deposits
-                
-                # Calculate client's share of the base crypto (after commission)
-                client_sats_amount = int(base_crypto_atoms * proportion)
+                # This client's share of the total DCA pool in tenths of a percent, for logging only
+                share_tenths = 1000 * client_balance // total_confirmed_deposits
+                client_sats_amount = client_sats[client_id]
                 
-                # Calculate equivalent fiat value for tracking purposes
                 # TODO: make client_fiat_amount float with 2 decimal presicion
-                client_fiat_amount = int(client_sats_amount / exchange_rate) if exchange_rate > 0 else 0
+                client_fiat_amount = client_fiats[client_id]
                 
                 distributions[client_id] = {
                     "fiat_amount": client_fiat_amount,
@@ -708,7 +915,10 @@ class LamassuTransactionProcessor:
                     "exchange_rate": exchange_rate
                 }
                 
-                logger.info(f"Client {client_id[:8]}... gets {client_sats_amount} sats (≈{client_fiat_amount} fiat units, {proportion:.2%} share)")
+                logger.info(
+                    "Client {:.8}... gets {} sats (≈{} fiat units, {}.{}% share)",
+                    client_id, client_sats_amount, client_fiat_amount, *divmod(share_tenths, 10)
+                )
             
             return distributions
             
@@ -716,54 +926,123 @@ class LamassuTransactionProcessor:
             logger.error(f"Error calculating distribution amounts: {e}")
             return {}
     
-    async def distribute_to_clients(self, transaction: Dict[str, Any], distributions: Dict[str, Dict[str, int]]) -> None:
-        """Send Bitcoin payments to DCA clients"""
+    async def record_client_payments(self, transaction: LamassuRow, distributions: Dict[str, Dict[str, int]], flow_clients: Optional[List[DcaClient]] = None) -> List[Tuple[DcaClient, Dict[str, Any], str]]:
+        """Record pending DCA payments for a transaction's distributions, returning (client, distribution, payment_id)"""
         try:
-            transaction_id = transaction["transaction_id"]
+            transaction_id = transaction.transaction_id
+            transaction_time = transaction.transaction_time  # Normalized UTC timestamp
+            
+            # Look clients up by id from a single fetch instead of re-querying per distribution
+            if flow_clients is None:
+                flow_clients = await get_flow_mode_clients()
+            client_map = {c.id: c for c in flow_clients}
             
+            # Build all payment records first so they are stored with a single INSERT
+            pending_payments = []
             for client_id, distribution in distributions.items():
-                try:
-                    # Get client info
-                    flow_clients = await get_flow_mode_clients()
-                    client = next((c for c in flow_clients if c.id == client_id), None)
-                    
-                    if not client:
-                        logger.error(f"Client {client_id} not found")
-                        continue
-                    
-                    # Create DCA payment record
-                    payment_data = CreateDcaPaymentData(
-                        client_id=client_id,
-                        amount_sats=distribution["sats_amount"],
-                        amount_fiat=distribution["fiat_amount"],
-                        exchange_rate=distribution["exchange_rate"],
-                        transaction_type="flow",
-                        lamassu_transaction_id=transaction_id,
-                        transaction_time=transaction_time  # Normalized UTC timestamp
-                    )
-                    
-                    # Record the payment in our database
-                    dca_payment = await create_dca_payment(payment_data)
-                    
+                # Get client info
+                client = client_map.get(client_id)
+                
+                if not client:
+                    logger.error(f"Client {client_id} not found")
+                    continue
+                
+                payment_data = CreateDcaPaymentData(
+                    client_id=client_id,
+                    amount_sats=distribution["sats_amount"],
+                    amount_fiat=distribution["fiat_amount"],
+                    exchange_rate=distribution["exchange_rate"],
+                    transaction_type="flow",
+                    lamassu_transaction_id=transaction_id,
+                    transaction_time=transaction_time
+                )
+                pending_payments.append((client, distribution, payment_data))
+            
+            if not pending_payments:
+                return []
+            
+            # Record the payments in our database
+            payment_ids = await create_dca_payments([payment_data for _, _, payment_data in pending_payments])
+            return [
+                (client, distribution, payment_id)
+                for (client, distribution, _), payment_id in zip(pending_payments, payment_ids)
+            ]
+            
+        except Exception as e:
+            logger.error(f"Error recording payments for transaction {transaction.transaction_id}: {e}")
+            return []
+    
+    async def distribute_to_clients(self, transaction: LamassuRow, distributions: Dict[str, Dict[str, int]], flow_clients: Optional[List[DcaClient]] = None, admin_config: Optional[LamassuConfig] = None, recorded_payments: Optional[List[Tuple[DcaClient, Dict[str, Any], str]]] = None) -> None:
+        """Send Bitcoin payments to DCA clients"""
+        try:
+            transaction_id = transaction.transaction_id
+            
+            # Record the payments first unless the caller already did
+            if recorded_payments is None:
+                recorded_payments = await self.record_client_payments(transaction, distributions, flow_clients)
+            if not recorded_payments:
+                return
+            
+            # Clients are independent, so send their payments concurrently (bounded; pay_invoice itself
+            # is additionally limited by the processor-wide inflight_payments semaphore)
+            distribution_slots = asyncio.Semaphore(MAX_CONCURRENT_DISTRIBUTIONS)
+            
+            # Check every target wallet with one query instead of one lookup per payment
+            existing_wallet_ids = await get_existing_wallet_ids(list({client.wallet_id for client, _, _ in recorded_payments}))
+            
+            # The exchange rate and transaction are shared by every client, so format the memo's cost
+            # basis and build the common extra fields once
+            cost_basis_memo = self.format_cost_basis_memo(recorded_payments[0][1].get("exchange_rate", 0))
+            base_extra = {"tag": "dca_distribution", "lamassu_transaction_id": transaction_id}
+            
+            async def process_one(client: DcaClient, distribution: Dict[str, Any]) -> bool:
+                async with distribution_slots:
                     # Send Bitcoin to client's wallet
-                    success = await self.send_dca_payment(client, distribution, transaction_id)
+                    success = await self.send_dca_payment(
+                        client, distribution, transaction_id, admin_config,
+                        target_wallet_exists=client.wallet_id in existing_wallet_ids,
+                        cost_basis_memo=cost_basis_memo,
+                        base_extra=base_extra
+                    )
                     if success:
-                        # Update payment status to confirmed after successful payment
-                        await self.update_payment_status(dca_payment.id, "confirmed")
-                        logger.info(f"DCA payment sent to client {client_id[:8]}...: {distribution['sats_amount']} sats")
+                        logger.info("DCA payment sent to client {:.8}...: {} sats", client.id, distribution["sats_amount"])
                     else:
-                        # Update payment status to failed if payment failed
-                        await self.update_payment_status(dca_payment.id, "failed")
-                        logger.error(f"Failed to send DCA payment to client {client_id[:8]}...")
-                    
-                except Exception as e:
-                    logger.error(f"Error processing distribution for client {client_id}: {e}")
-                    continue
+                        logger.error("Failed to send DCA payment to client {:.8}...", client.id)
+                    return success
+            
+            results = await asyncio.gather(
+                *(process_one(client, distribution) for client, distribution, _ in recorded_payments),
+                return_exceptions=True
+            )
+            
+            # Record the outcomes with one UPDATE per status instead of one per payment; a payment whose
+            # send raised is failed too, so it does not keep reserving the client's balance as pending
+            confirmed_ids = []
+            failed_ids = []
+            for (client, _, payment_id), result in zip(recorded_payments, results):
+                if isinstance(result, Exception):
+                    logger.error(f"Error processing distribution for client {client.id}: {result}")
+                    failed_ids.append(payment_id)
+                elif result:
+                    confirmed_ids.append(payment_id)
+                else:
+                    failed_ids.append(payment_id)
+            await self.update_payment_statuses(confirmed_ids, "confirmed")
+            await self.update_payment_statuses(failed_ids, "failed")
                     
         except Exception as e:
             logger.error(f"Error distributing to clients: {e}")
     
-    async def send_dca_payment(self, client: DcaClient, distribution: Dict[str, Any], lamassu_transaction_id: str) -> bool:
+    @staticmethod
+    def format_cost_basis_memo(exchange_rate: float) -> str:
+        """Memo suffix with the cost basis (fiat per BTC), empty without a usable exchange rate"""
+        if exchange_rate > 0:
+            # exchange_rate is sats per fiat unit, so convert to fiat per BTC
+            cost_basis_per_btc = 100_000_000 / exchange_rate  # 100M sats = 1 BTC
+            return f" • Cost basis: {cost_basis_per_btc:,.2f} GTQ/BTC"
+        return ""
+    
+    async def send_dca_payment(self, client: DcaClient, distribution: Dict[str, Any], lamassu_transaction_id: str, admin_config: Optional[LamassuConfig] = None, target_wallet_exists: Optional[bool] = None, cost_basis_memo: Optional[str] = None, base_extra: Optional[Dict[str, Any]] = None) -> bool:
         """Send Bitcoin payment to a DCA client's wallet"""
         try:
             # For now, we only support wallet_id payments (internal LNBits transfers)
@@ -771,65 +1050,40 @@ class LamassuTransactionProcessor:
             amount_sats = distribution["sats_amount"]
             amount_msat = amount_sats * 1000  # Convert sats to millisats
             
-            # Validate the target wallet exists
-            target_wallet = await get_wallet(target_wallet_id)
-            if not target_wallet:
+            # Validate the target wallet exists (unless already checked in bulk by the caller)
+            if target_wallet_exists is None:
+                target_wallet_exists = await get_wallet(target_wallet_id) is not None
+            if not target_wallet_exists:
                 logger.error(f"Target wallet {target_wallet_id} not found for client {client.username or client.user_id}")
                 return False
             
-            # Create descriptive memo with DCA metrics
+            # Create descriptive memo with DCA metrics (the cost basis part is shared across the distribution)
             fiat_amount = distribution.get("fiat_amount", 0)
-            exchange_rate = distribution.get("exchange_rate", 0)
-            
-            # Calculate cost basis (fiat per BTC)
-            if exchange_rate > 0:
-                # exchange_rate is sats per fiat unit, so convert to fiat per BTC
-                cost_basis_per_btc = 100_000_000 / exchange_rate  # 100M sats = 1 BTC
-                memo = f"DCA: {amount_sats:,} sats • {fiat_amount:,} GTQ • Cost basis: {cost_basis_per_btc:,.2f} GTQ/BTC"
-            else:
-                memo = f"DCA: {amount_sats:,} sats • {fiat_amount:,} GTQ"
-            
-            # Create invoice in target wallet
-            extra={
-                "tag": "dca_distribution",
-                "client_id": client.id,
-                "lamassu_transaction_id": lamassu_transaction_id,
-                "distribution_amount": amount_sats
-            }
-            new_payment = await create_invoice(
-                wallet_id=target_wallet.id,
-                amount=amount_sats,  # LNBits create_invoice expects sats
-                internal=True,  # Internal transfer within LNBits
-                memo=memo,
-                extra=extra
-            )
+            if cost_basis_memo is None:
+                cost_basis_memo = self.format_cost_basis_memo(distribution.get("exchange_rate", 0))
+            memo = f"DCA: {amount_sats:,} sats • {fiat_amount:,} GTQ{cost_basis_memo}"
             
-            if not new_payment:
-                logger.error(f"Failed to create invoice for client {client.username or client.user_id}")
-                return False
+            if base_extra is None:
+                base_extra = {"tag": "dca_distribution", "lamassu_transaction_id": lamassu_transaction_id}
+            extra = {**base_extra, "client_id": client.id, "distribution_amount": amount_sats}
             
-            # Pay the invoice from the DCA admin wallet (this extension's wallet)
-            # Get the admin wallet that manages DCA funds
-            admin_config = await get_active_lamassu_config()
+            # Get the admin wallet that manages DCA funds (this extension's wallet)
+            if admin_config is None:
+                admin_config = await get_active_lamassu_config()
             if not admin_config:
                 logger.error("No active Lamassu config found - cannot determine source wallet")
                 return False
             
             if not admin_config.source_wallet_id:
-                logger.warning("DCA source wallet not configured - payment creation successful but not sent")
-                logger.info(f"Created invoice for {amount_sats} sats to client {client.username or client.user_id}")
-                logger.info(f"Invoice: {new_payment.bolt11}")
+                logger.warning(f"DCA source wallet not configured - {amount_sats} sats for client {client.username or client.user_id} not sent")
                 return True
             
-            # Pay the invoice from the configured source wallet
+            # Transfer from the configured source wallet to the client's wallet
             try:
-                await pay_invoice(
-                    payment_request=new_payment.bolt11,
-                    wallet_id=admin_config.source_wallet_id,
-                    description=memo,
-                    extra=extra
-                )
-                logger.info(f"DCA payment completed: {amount_sats} sats sent to {client.username or client.user_id}")
+                if not await self.internal_transfer(admin_config.source_wallet_id, target_wallet_id, amount_sats, memo, extra):
+                    logger.error(f"Failed to create invoice for client {client.username or client.user_id}")
+                    return False
+                logger.info("DCA payment completed: {} sats sent to {}", amount_sats, client.username or client.user_id)
                 return True
             except Exception as e:
                 logger.error(f"Failed to pay invoice for client {client.username or client.user_id}: {e}")
@@ -839,17 +1093,47 @@ class LamassuTransactionProcessor:
             logger.error(f"Error sending DCA payment to client {client.username or client.user_id}: {e}")
             return False
     
-    async def credit_source_wallet(self, transaction: Dict[str, Any]) -> bool:
+    async def internal_transfer(
+        self,
+        source_wallet_id: str,
+        target_wallet_id: str,
+        amount_sats: int,
+        memo: str,
+        extra: Dict[str, Any],
+        payment_extra: Optional[Dict[str, Any]] = None
+    ) -> bool:
+        """Move sats between two LNbits wallets: an internal invoice in the target wallet paid from the source wallet"""
+        invoice = await create_invoice(
+            wallet_id=target_wallet_id,
+            amount=amount_sats,  # LNBits create_invoice expects sats
+            internal=True,  # Settled inside LNbits, never routed over Lightning
+            memo=memo,
+            extra=extra
+        )
+        if not invoice:
+            return False
+        
+        async with self.inflight_payments:
+            await pay_invoice(
+                payment_request=invoice.bolt11,
+                wallet_id=source_wallet_id,
+                description=memo,
+                extra=payment_extra or extra
+            )
+        return True
+    
+    async def credit_source_wallet(self, transaction: LamassuRow, admin_config: Optional[LamassuConfig] = None) -> bool:
         """Credit the source wallet with the full crypto_atoms amount from Lamassu transaction"""
         try:
             # Get the configuration to find source wallet
-            admin_config = await get_active_lamassu_config()
+            if admin_config is None:
+                admin_config = await get_active_lamassu_config()
             if not admin_config or not admin_config.source_wallet_id:
                 logger.error("No source wallet configured - cannot credit wallet")
                 return False
             
-            crypto_atoms = transaction["crypto_amount"]  # Full amount including commission
-            transaction_id = transaction["transaction_id"]
+            crypto_atoms = transaction.crypto_amount  # Full amount including commission
+            transaction_id = transaction.transaction_id
             
             # Get the source wallet object
             source_wallet = await get_wallet(admin_config.source_wallet_id)
@@ -867,70 +1151,72 @@ class LamassuTransactionProcessor:
             return True
             
         except Exception as e:
-            logger.error(f"Error crediting source wallet for transaction {transaction.get('transaction_id', 'unknown')}: {e}")
+            logger.error(f"Error crediting source wallet for transaction {transaction.transaction_id}: {e}")
             return False
 
-    async def update_payment_status(self, payment_id: str, status: str) -> None:
-        """Update the status of a DCA payment"""
+    async def update_payment_statuses(self, payment_ids: List[str], status: str) -> None:
+        """Update the status of several DCA payments"""
+        if not payment_ids:
+            return
         try:
-            await update_dca_payment_status(payment_id, status)
-            logger.info(f"Updated payment {payment_id[:8]}... status to {status}")
+            await update_dca_payment_statuses(payment_ids, status)
+            logger.info(f"Updated {len(payment_ids)} payment(s) status to {status}")
         except Exception as e:
-            logger.error(f"Error updating payment status for {payment_id}: {e}")
+            logger.error(f"Error updating payment status for {payment_ids}: {e}")
 
-    async def store_lamassu_transaction(self, transaction: Dict[str, Any]) -> Optional[str]:
-        """Store the Lamassu transaction in our database for audit and UI"""
+    async def store_lamassu_transaction(self, transaction: LamassuRow, economics: Optional[TxEconomics] = None, distributions: Optional[Dict[str, Dict[str, int]]] = None) -> Optional[str]:
+        """Store the Lamassu transaction and its distribution statistics in our database for audit and UI"""
         try:
             # Extract and validate transaction data
-            crypto_atoms = transaction.get("crypto_amount", 0)
-            fiat_amount = transaction.get("fiat_amount", 0)
-            commission_percentage = transaction.get("commission_percentage") or 0.0
-            discount = transaction.get("discount") or 0.0
-            
-            # Calculate commission metrics
-            if commission_percentage > 0:
-                effective_commission = commission_percentage * (100 - discount) / 100
-                base_crypto_atoms = int(crypto_atoms / (1 + effective_commission))
-                commission_amount_sats = crypto_atoms - base_crypto_atoms
-            else:
-                effective_commission = 0.0
-                base_crypto_atoms = crypto_atoms
-                commission_amount_sats = 0
+            crypto_atoms = transaction.crypto_amount
+            fiat_amount = transaction.fiat_amount
+            commission_percentage = transaction.commission_percentage
+            discount = transaction.discount
+            transaction_time = transaction.transaction_time
+            if transaction_time is not None:
+                transaction_time = _to_utc(transaction_time)
             
-            # Calculate exchange rate
-            exchange_rate = base_crypto_atoms / fiat_amount if fiat_amount > 0 else 0
+            # Commission metrics and exchange rate
+            if economics is None:
+                economics = compute_economics(transaction)
             
             # Create transaction data
             transaction_data = CreateLamassuTransactionData(
-                lamassu_transaction_id=transaction["transaction_id"],
+                lamassu_transaction_id=transaction.transaction_id,
                 fiat_amount=fiat_amount,
                 crypto_amount=crypto_atoms,
                 commission_percentage=commission_percentage,
                 discount=discount,
-                effective_commission=effective_commission,
-                commission_amount_sats=commission_amount_sats,
-                base_amount_sats=base_crypto_atoms,
-                exchange_rate=exchange_rate,
-                crypto_code=transaction.get("crypto_code", "BTC"),
-                fiat_code=transaction.get("fiat_code", "GTQ"),
-                device_id=transaction.get("device_id"),
+                effective_commission=economics.effective_commission,
+                commission_amount_sats=economics.commission_sats,
+                base_amount_sats=economics.base_sats,
+                exchange_rate=economics.exchange_rate,
+                crypto_code=transaction.crypto_code,
+                fiat_code=transaction.fiat_code,
+                device_id=transaction.device_id,
                 transaction_time=transaction_time  # Normalized UTC timestamp
             )
             
-            # Store in database
-            stored_transaction = await create_lamassu_transaction(transaction_data)
-            logger.info(f"Stored Lamassu transaction {transaction['transaction_id']} in database")
+            # Store in database, with the distribution statistics in the same INSERT
+            distributions = distributions or {}
+            stored_transaction = await create_lamassu_transaction(
+                transaction_data,
+                len(distributions),
+                sum(dist["sats_amount"] for dist in distributions.values())
+            )
+            logger.info(f"Stored Lamassu transaction {transaction.transaction_id} in database")
             return stored_transaction.id
             
         except Exception as e:
-            logger.error(f"Error storing Lamassu transaction {transaction.get('transaction_id', 'unknown')}: {e}")
+            logger.error(f"Error storing Lamassu transaction {transaction.transaction_id}: {e}")
             return None
 
-    async def send_commission_payment(self, transaction: Dict[str, Any], commission_amount_sats: int) -> bool:
+    async def send_commission_payment(self, transaction: LamassuRow, commission_amount_sats: int, admin_config: Optional[LamassuConfig] = None) -> bool:
         """Send commission to the configured commission wallet"""
         try:
             # Get the configuration to find commission wallet
-            admin_config = await get_active_lamassu_config()
+            if admin_config is None:
+                admin_config = await get_active_lamassu_config()
             if not admin_config or not admin_config.commission_wallet_id:
                 logger.info("No commission wallet configured - commission remains in source wallet")
                 return True  # Not an error, just no transfer needed
@@ -939,109 +1225,161 @@ class LamassuTransactionProcessor:
                 logger.error("No source wallet configured - cannot send commission")
                 return False
             
-            transaction_id = transaction["transaction_id"]
+            transaction_id = transaction.transaction_id
             
             # Create invoice in commission wallet with DCA metrics
-            fiat_amount = transaction.get("fiat_amount", 0)
-            commission_percentage = transaction.get("commission_percentage", 0) * 100  # Convert to percentage
+            fiat_amount = transaction.fiat_amount
+            commission_percentage = transaction.commission_percentage * 100  # Convert to percentage
             commission_memo = f"DCA Commission: {commission_amount_sats:,} sats • {commission_percentage:.1f}% • {fiat_amount:,} GTQ transaction"
             
-            commission_payment = await create_invoice(
-                wallet_id=admin_config.commission_wallet_id,
-                amount=commission_amount_sats,
-                internal=True,
-                memo=commission_memo,
+            # Transfer the commission from the source wallet to the commission wallet
+            transferred = await self.internal_transfer(
+                admin_config.source_wallet_id,
+                admin_config.commission_wallet_id,
+                commission_amount_sats,
+                commission_memo,
                 extra={
                     "tag": "dca_commission",
                     "lamassu_transaction_id": transaction_id,
                     "commission_amount": commission_amount_sats
-                }
-            )
-            
-            if not commission_payment:
-                logger.error(f"Failed to create commission invoice for transaction {transaction_id}")
-                return False
-            
-            # Pay the commission invoice from source wallet
-            await pay_invoice(
-                payment_request=commission_payment.bolt11,
-                wallet_id=admin_config.source_wallet_id,
-                description=commission_memo,
-                extra={
+                },
+                payment_extra={
                     "tag": "dca_commission_payment",
                     "lamassu_transaction_id": transaction_id
                 }
             )
+            if not transferred:
+                logger.error(f"Failed to create commission invoice for transaction {transaction_id}")
+                return False
             
             logger.info(f"Commission payment completed: {commission_amount_sats} sats sent to commission wallet for transaction {transaction_id}")
             return True
             
         except Exception as e:
-            logger.error(f"Error sending commission payment for transaction {transaction.get('transaction_id', 'unknown')}: {e}")
+            logger.error(f"Error sending commission payment for transaction {transaction.transaction_id}: {e}")
             return False
 
-    async def process_transaction(self, transaction: Dict[str, Any]) -> None:
+    async def process_transaction(self, transaction: LamassuRow, flow_clients: Optional[List[DcaClient]] = None, admin_config: Optional[LamassuConfig] = None) -> None:
         """Process a single transaction - calculate and distribute DCA payments"""
         try:
-            transaction_id = transaction["transaction_id"]
-            
-            # Check if transaction already processed
-            existing_payments = await get_payments_by_lamassu_transaction(transaction_id)
-            if existing_payments:
-                logger.info(f"Transaction {transaction_id} already processed - skipping")
-                return
-            
-            logger.info(f"Processing new transaction: {transaction_id}")
-            
-            # First, credit the source wallet with the full transaction amount
-            credit_success = await self.credit_source_wallet(transaction)
-            if not credit_success:
-                logger.error(f"Failed to credit source wallet for transaction {transaction_id} - skipping distribution")
-                return
-            
-            # Store the transaction in our database for audit and UI
-            stored_transaction = await self.store_lamassu_transaction(transaction)
-            
-            # Calculate distribution amounts
-            distributions = await self.calculate_distribution_amounts(transaction)
-            
-            if not distributions:
-                logger.info(f"No distributions calculated for transaction {transaction_id}")
-                return
-            
-            # Calculate commission amount for sending to commission wallet
-            crypto_atoms = transaction.get("crypto_amount", 0)
-            commission_percentage = transaction.get("commission_percentage") or 0.0
-            discount = transaction.get("discount") or 0.0
-            
-            if commission_percentage and commission_percentage > 0:
-                effective_commission = commission_percentage * (100 - discount) / 100
-                base_crypto_atoms = int(crypto_atoms / (1 + effective_commission))
-                commission_amount_sats = crypto_atoms - base_crypto_atoms
-            else:
-                commission_amount_sats = 0
+            transaction_id = transaction.transaction_id
+            
+            # Calculate distribution amounts (sharing one client list fetch with the distribution step)
+            if flow_clients is None:
+                flow_clients = await get_flow_mode_clients()
+            # Resolve the wallet configuration once for the credit, distribution and commission steps
+            # (polls pass the configuration they already hold)
+            if admin_config is None:
+                admin_config = await get_active_lamassu_config()
+            # Split the commission once; storage, distribution and the commission payment all share it
+            economics = compute_economics(transaction)
+            
+            # Transactions are processed concurrently, but each one's accounting (duplicate check, credit,
+            # balance snapshot and payment records) runs alone so balances always reflect earlier payouts;
+            # only the payouts themselves overlap
+            async with self.accounting_lock:
+                # Check if transaction already processed (in-memory cache first, then database)
+                if self.is_processed(transaction_id):
+                    logger.info(f"Transaction {transaction_id} already processed - skipping")
+                    return
+                
+                if await lamassu_transaction_is_processed(transaction_id):
+                    self.mark_processed(transaction_id)
+                    logger.info(f"Transaction {transaction_id} already processed - skipping")
+                    return
+                
+                logger.info(f"Processing new transaction: {transaction_id}")
+                
+                # Credit the source wallet with the full transaction amount while the read-only balance
+                # calculation runs (the wallet lives in the LNbits core database, balances in ours);
+                # nothing is distributed unless the credit succeeded
+                credit_success, distributions = await asyncio.gather(
+                    self.credit_source_wallet(transaction, admin_config),
+                    self.calculate_distribution_amounts(transaction, flow_clients, economics)
+                )
+                if not credit_success:
+                    logger.error(f"Failed to credit source wallet for transaction {transaction_id} - skipping distribution")
+                    return
+                
+                # Once the source wallet is credited the transaction must never be picked up again
+                self.mark_processed(transaction_id)
+                
+                # Store the transaction in our database for audit and UI (also when nothing is distributed,
+                # since the source wallet was credited)
+                await self.store_lamassu_transaction(transaction, economics, distributions)
+                
+                if not distributions:
+                    logger.info(f"No distributions calculated for transaction {transaction_id}")
+                    return
+                
+                # Record the pending payments (they reserve the clients' balances from here on)
+                recorded_payments = await self.record_client_payments(transaction, distributions, flow_clients)
             
             # Distribute to clients
-            await self.distribute_to_clients(transaction, distributions)
+            await self.distribute_to_clients(transaction, distributions, flow_clients, admin_config, recorded_payments)
             
             # Send commission to commission wallet (if configured)
-            if commission_amount_sats > 0:
-                await self.send_commission_payment(transaction, commission_amount_sats)
-            
-            # Update distribution statistics in stored transaction
-            if stored_transaction:
-                clients_count = len(distributions)
-                distributions_total_sats = sum(dist["sats_amount"] for dist in distributions.values())
-                await update_lamassu_transaction_distribution_stats(
-                    stored_transaction, 
-                    clients_count, 
-                    distributions_total_sats
-                )
+            if economics.commission_sats > 0:
+                await self.send_commission_payment(transaction, economics.commission_sats, admin_config)
             
             logger.info(f"Successfully processed transaction {transaction_id}")
             
         except Exception as e:
-            logger.error(f"Error processing transaction {transaction.get('transaction_id', 'unknown')}: {e}")
+            logger.error(f"Error processing transaction {transaction.transaction_id}: {e}")
+    
+    async def process_new_transactions(self, db_config: Dict[str, Any], admin_config: Optional[LamassuConfig] = None) -> int:
+        """Stream new transactions through the bounded pending queue to a pool of workers and record poll success"""
+        # Backpressure: leave the poll for later while an earlier batch is still being worked off
+        if self.pending_queue.qsize() > 0.8 * self.pending_queue.maxsize:
+            logger.info(f"Skipping fetch: {self.pending_queue.qsize()} transactions still pending")
+            return 0
+        
+        self.ensure_poll_index(db_config)
+        
+        # One configuration serves the whole poll: the fetch threshold and every transaction's payouts
+        if admin_config is None:
+            admin_config = await get_active_lamassu_config()
+        
+        transactions_processed = 0
+        
+        async def worker() -> None:
+            nonlocal transactions_processed
+            while True:
+                transaction, flow_clients = await self.pending_queue.get()
+                try:
+                    await self.process_transaction(transaction, flow_clients, admin_config)
+                    transactions_processed += 1
+                except Exception as e:
+                    # Keep the worker alive so the queue always drains
+                    logger.error(f"Error processing queued transaction {transaction.transaction_id}: {e}")
+                finally:
+                    self.pending_queue.task_done()
+        
+        workers = [asyncio.create_task(worker()) for _ in range(MAX_CONCURRENT_TRANSACTIONS)]
+        try:
+            # Produce: workers start on each transaction as soon as it streams in; put() waits while the
+            # queue is full, so no more than the queue size is ever held in memory
+            new_watermark = None
+            flow_clients = None
+            async for transaction in self.fetch_new_transactions(db_config, admin_config):
+                # The Flow Mode client list is constant for the batch, so fetch it once instead of per transaction
+                if flow_clients is None:
+                    flow_clients = await get_flow_mode_clients()
+                if new_watermark is None or transaction.transaction_time > new_watermark:
+                    new_watermark = transaction.transaction_time
+                await self.pending_queue.put((transaction, flow_clients))
+        finally:
+            # Let every queued transaction finish (even if the stream failed) before stopping the workers
+            await self.pending_queue.join()
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+        
+        # Record successful poll completion, advancing the watermark to the newest transaction
+        # so the next poll only asks Lamassu for strictly newer rows
+        await update_poll_success_time(db_config["config_id"], new_watermark)
+        logger.info(f"Poll success recorded (watermark: {new_watermark or 'unchanged'})")
+        return transactions_processed
     
     async def poll_and_process(self) -> None:
         """Main polling function - checks for new transactions and processes them"""
@@ -1061,18 +1399,12 @@ class LamassuTransactionProcessor:
             await update_poll_start_time(config_id)
             logger.info("Poll start time recorded")
             
-            # Fetch new transactions via SSH
-            new_transactions = await self.fetch_new_transactions(db_config)
-            
-            # Process each transaction
-            transactions_processed = 0
-            for transaction in new_transactions:
-                await self.process_transaction(transaction)
-                transactions_processed += 1
+            # Read the configuration once for the whole cycle instead of once per payout
+            admin_config = await get_active_lamassu_config()
             
-            # Record successful poll completion
-            await update_poll_success_time(config_id)
-            logger.info(f"Completed processing {transactions_processed} transactions. Poll success time recorded.")
+            # Fetch and process new transactions
+            transactions_processed = await self.process_new_transactions(db_config, admin_config)
+            logger.info(f"Completed processing {transactions_processed} transactions.")
                 
         except Exception as e:
             logger.error(f"Error in polling cycle: {e}")
@@ -1086,3 +1418,8 @@ transaction_processor = LamassuTransactionProcessor()
 async def poll_lamassu_transactions() -> None:
     """Entry point for the polling task"""
     await transaction_processor.poll_and_process()
+
+
+async def shutdown_lamassu_processor() -> None:
+    """Entry point for the extension stop"""
+    await transaction_processor.shutdown()
@@ -5,6 +5,14 @@ from fastapi.responses import HTMLResponse
 from lnbits.core.models import User
 from lnbits.decorators import check_super_user
 from lnbits.helpers import template_renderer
+from pydantic.json import pydantic_encoder
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    # Fallback to pydantic's stdlib json encoding
+    ORJSON_AVAILABLE = False
 
 satmachineadmin_generic_router = APIRouter()
 
@@ -13,9 +21,16 @@ def satmachineadmin_renderer():
     return template_renderer(["satmachineadmin/templates"])
 
 
+def user_json(user: User) -> str:
+    """Serialize the user for the template, with orjson when it is installed"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(user.dict(), default=pydantic_encoder).decode()
+    return user.json()
+
+
 # DCA Admin page - Requires superuser access
 @satmachineadmin_generic_router.get("/", response_class=HTMLResponse)
 async def index(req: Request, user: User = Depends(check_super_user)):
     return satmachineadmin_renderer().TemplateResponse(
-        "satmachineadmin/index.html", {"request": req, "user": user.json()}
+        "satmachineadmin/index.html", {"request": req, "user": user_json(user)}
     )
@@ -4,6 +4,7 @@ from http import HTTPStatus
 from typing import Optional
 
 from fastapi import APIRouter, Depends, Request
+from fastapi.responses import JSONResponse, ORJSONResponse
 from lnbits.core.crud import get_user
 from lnbits.core.models import User, WalletTypeInfo
 from lnbits.core.services import create_invoice
@@ -45,9 +46,13 @@ from .models import (
     LamassuConfig,
     UpdateLamassuConfigData,
     StoredLamassuTransaction,
+    LamassuRow,
 )
+from .views import ORJSON_AVAILABLE
 
-satmachineadmin_api_router = APIRouter()
+satmachineadmin_api_router = APIRouter(
+    default_response_class=ORJSONResponse if ORJSON_AVAILABLE else JSONResponse
+)
 
 
 ###################################################
@@ -194,7 +199,7 @@ async def api_manual_poll(
     """Manually trigger a poll of the Lamassu database"""
     try:
         from .transaction_processor import transaction_processor
-        from .crud import update_poll_start_time, update_poll_success_time
+        from .crud import update_poll_start_time
 
         # Get database configuration
         db_config = await transaction_processor.connect_to_lamassu_db()
@@ -209,16 +214,10 @@ async def api_manual_poll(
         # Record manual poll start time
         await update_poll_start_time(config_id)
 
-        # Fetch and process transactions via SSH
-        new_transactions = await transaction_processor.fetch_new_transactions(db_config)
-
-        transactions_processed = 0
-        for transaction in new_transactions:
-            await transaction_processor.process_transaction(transaction)
-            transactions_processed += 1
-
-        # Record successful manual poll completion
-        await update_poll_success_time(config_id)
+        # Fetch and process transactions, recording successful poll completion
+        transactions_processed = await transaction_processor.process_new_transactions(
+            db_config
+        )
 
         return {
             "success": True,
@@ -242,49 +241,41 @@ async def api_test_transaction(
 ) -> dict:
     """Test transaction processing with simulated Lamassu transaction data"""
     try:
-        from .transaction_processor import transaction_processor
+        from .transaction_processor import transaction_processor, compute_economics
         import uuid
         from datetime import datetime, timezone
 
         # Create a mock transaction that mimics Lamassu database structure
-        mock_transaction = {
-            "transaction_id": str(uuid.uuid4())[:8],  # Short ID for testing
-            "crypto_amount": crypto_atoms,  # Total sats including commission
-            "fiat_amount": 100,  # Mock fiat amount (100 centavos = 1 GTQ)
-            "commission_percentage": commission_percentage,  # Already as decimal
-            "discount": discount,
-            "transaction_time": datetime.now(timezone.utc),
-            "crypto_code": "BTC",
-            "fiat_code": "GTQ",
-            "device_id": "test_device",
-            "status": "confirmed",
-        }
+        mock_transaction = LamassuRow(
+            transaction_id=str(uuid.uuid4())[:8],  # Short ID for testing
+            crypto_amount=crypto_atoms,  # Total sats including commission
+            fiat_amount=100,  # Mock fiat amount (100 centavos = 1 GTQ)
+            commission_percentage=commission_percentage,  # Already as decimal
+            discount=discount,
+            transaction_time=datetime.now(timezone.utc),
+            crypto_code="BTC",
+            fiat_code="GTQ",
+            device_id="test_device",
+            status="confirmed",
+        )
 
         # Process the mock transaction through the complete DCA flow
         await transaction_processor.process_transaction(mock_transaction)
 
         # Calculate commission for response
-        if commission_percentage > 0:
-            effective_commission = commission_percentage * (100 - discount) / 100
-            base_crypto_atoms = int(crypto_atoms / (1 + effective_commission))
-            commission_amount_sats = crypto_atoms - base_crypto_atoms
-        else:
-            base_crypto_atoms = crypto_atoms
-            commission_amount_sats = 0
+        economics = compute_economics(mock_transaction)
 
         return {
             "success": True,
             "message": "Test transaction processed successfully",
             "transaction_details": {
-                "transaction_id": mock_transaction["transaction_id"],
+                "transaction_id": mock_transaction.transaction_id,
                 "total_amount_sats": crypto_atoms,
-                "base_amount_sats": base_crypto_atoms,
-                "commission_amount_sats": commission_amount_sats,
+                "base_amount_sats": economics.base_sats,
+                "commission_amount_sats": economics.commission_sats,
                 "commission_percentage": commission_percentage
                 * 100,  # Show as percentage
-                "effective_commission": effective_commission * 100
-                if commission_percentage > 0
-                else 0,
+                "effective_commission": economics.effective_commission * 100,
                 "discount": discount,
             },
         }
@@ -337,16 +328,17 @@ async def api_get_transaction_distributions(
         )
 
     # Get all DCA payments for this Lamassu transaction
-    from .crud import get_payments_by_lamassu_transaction, get_dca_client
+    from .crud import get_payments_by_lamassu_transaction
 
     payments = await get_payments_by_lamassu_transaction(
         transaction.lamassu_transaction_id
     )
 
-    # Enhance payments with client information
+    # Enhance payments with client information (one client query, then dict lookups)
+    clients_by_id = {client.id: client for client in await get_dca_clients()}
     distributions = []
     for payment in payments:
-        client = await get_dca_client(payment.client_id)
+        client = clients_by_id.get(payment.client_id)
         distributions.append(
             {
                 "payment_id": payment.id,